@@ -0,0 +1,206 @@
+"""Benchmarks for color scheme interpolation, rendering, parsing and preset import.
+
+Results are written as JSON so runs can be compared over time. GUI cases draw
+into an offscreen wx.MemoryDC, on a headless Linux box run them under Xvfb:
+
+    xvfb-run -a python bench.py -o bench.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+import timeit
+
+import numpy as np
+import wx
+
+from color_scheme import ColorScheme, GradientEditor, ColorSchemePicker, gradient_cache
+from presets import PresetLibrary
+from ruler import RulerWidget
+
+STOP_COUNTS = [2, 16, 256, 1024]
+VALUE_COUNTS = [10**3, 10**5, 10**7]
+SCALAR_VALUE_COUNTS = [10**3, 10**4]
+WIDTHS = [200, 800, 2000]
+SEED = 12345
+
+
+def make_scheme(stops, rng):
+    positions = np.sort(rng.uniform(-1000, 1000, stops))
+    colors = rng.integers(0, 256, (stops, 3))
+    return ColorScheme(positions=positions, colors=colors)
+
+
+def measure(func, repeat):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": float(np.median(times)),
+    }
+
+
+class Bench:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, func, **params):
+        result = {"name": name, "params": params}
+        result.update(measure(func, self.repeat))
+        self.results.append(result)
+        print(
+            "%-28s %-40s %12.3f us"
+            % (name, json.dumps(params), result["min_s"] * 1e6),
+            file=sys.stderr,
+        )
+
+
+def bench_interpolation(bench, rng):
+    for stops in STOP_COUNTS:
+        scheme = make_scheme(stops, rng)
+        v_min, v_max = scheme.min_value(), scheme.max_value()
+        for count in SCALAR_VALUE_COUNTS:
+            values = rng.uniform(v_min, v_max, count).tolist()
+            bench.run(
+                "scalar.color_at",
+                lambda: [scheme.color_at(v) for v in values],
+                stops=stops,
+                values=count,
+            )
+            bench.run(
+                "scalar.interpolate",
+                lambda: [scheme.interpolate(v) for v in values],
+                stops=stops,
+                values=count,
+            )
+        for count in VALUE_COUNTS:
+            values = rng.uniform(v_min - 10, v_max + 10, count)
+            bench.run(
+                "batch.map_values",
+                lambda: scheme.map_values(values),
+                stops=stops,
+                values=count,
+            )
+            bench.run(
+                "batch.map_values_exact",
+                lambda: scheme.map_values(values, exact=True),
+                stops=stops,
+                values=count,
+            )
+
+
+def bench_parsing(bench, rng, presets_path):
+    for stops in STOP_COUNTS:
+        scheme = make_scheme(stops, rng)
+        text = json.dumps(scheme.schema)
+        paraview = scheme.to_paraview()
+        bench.run("parse.from_string", lambda: ColorScheme.from_string(text), stops=stops)
+        bench.run("parse.to_string", lambda: ColorScheme(scheme.schema).to_string(), stops=stops)
+        bench.run(
+            "parse.from_paraview", lambda: ColorScheme.from_paraview(paraview), stops=stops
+        )
+
+    def import_presets():
+        with open(presets_path, "r") as f:
+            data = json.load(f)
+        return [ColorScheme.from_paraview(o["RGBPoints"]) for o in data if "RGBPoints" in o]
+
+    def lookup_presets():
+        library = PresetLibrary(presets_path)
+        return [library.scheme(n) for n in ("Smin_Val", "Smid_Val", "Smax_Val")]
+
+    bench.run("presets.import_all", import_presets, path=presets_path)
+    bench.run("presets.library_lookup", lookup_presets, path=presets_path)
+
+
+def bench_rendering(bench, rng):
+    app = wx.App(False)
+    frame = wx.Frame(None)
+    editor = GradientEditor()
+    ruler = RulerWidget(frame, threshold=50)
+    for stops in STOP_COUNTS:
+        scheme = make_scheme(stops, rng)
+        picker = ColorSchemePicker(frame, scheme)
+        for width in WIDTHS:
+            height = 30
+            bitmap = wx.Bitmap(width, height)
+            dc = wx.MemoryDC(bitmap)
+            rect = wx.Rect(0, 0, width, height)
+            text = scheme.to_string()
+
+            def picker_cold():
+                picker._bitmap_value = None
+                picker.paint(dc, width, height)
+
+            def editor_cold():
+                gradient_cache.clear()
+                editor.DrawValue(dc, rect, None, text)
+
+            params = {"stops": stops, "width": width}
+            bench.run("render.picker", picker_cold, **params)
+            bench.run("render.picker_cached", lambda: picker.paint(dc, width, height), **params)
+            bench.run("render.editor", editor_cold, **params)
+            bench.run(
+                "render.editor_cached",
+                lambda: editor.DrawValue(dc, rect, None, text),
+                **params
+            )
+            dc.SelectObject(wx.NullBitmap)
+        picker.Destroy()
+
+    for width in WIDTHS:
+        height = 15
+        bitmap = wx.Bitmap(width, height)
+        dc = wx.MemoryDC(bitmap)
+        ruler.set_scale(width / 600, draw=False)
+        ruler.set_offset(100, draw=False)
+
+        def ruler_cold():
+            ruler._bitmap = None
+            ruler.paint(dc, width, height)
+
+        bench.run("render.ruler", ruler_cold, width=width)
+        bench.run(
+            "render.ruler_cached", lambda: ruler.paint(dc, width, height), width=width
+        )
+        dc.SelectObject(wx.NullBitmap)
+    frame.Destroy()
+    app.Destroy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="bench.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--presets", default="ColorsParaView.json")
+    parser.add_argument("--no-gui", action="store_true", help="skip rendering cases")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    bench = Bench(args.repeat)
+    bench_interpolation(bench, rng)
+    bench_parsing(bench, rng, args.presets)
+    if not args.no_gui:
+        bench_rendering(bench, rng)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "wx": wx.version(),
+        "seed": SEED,
+        "results": bench.results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
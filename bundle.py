@@ -0,0 +1,171 @@
+import json
+import os
+import struct
+
+from scheme_model import ColorScheme
+
+
+class SchemeBundle:
+    """File holding many named color schemes behind an index table.
+
+    Layout: a fixed header (magic, version, offset and length of the index,
+    end of the journal), a JSON index {name: [offset, length]} of the
+    schemes stored when the file was last compacted, then a journal of
+    appended entries. Every entry is a small header (name length, record
+    length), the name and the scheme as a binary .colorscheme record; a later
+    entry with the same name replaces an earlier one. Opening the file
+    replays the journal, reading one scheme touches only that record.
+
+    Appending writes the entry at the end of the journal and then moves the
+    journal end in the header, so existing data is never rewritten and an
+    interrupted append leaves the previous contents readable. The file is
+    flushed to disk on close(). Replaced records are left as dead space, the
+    file is compacted once they take more room than the live ones.
+    """
+
+    MAGIC = b"SGCB"
+    VERSION = 3
+    HEADER = struct.Struct("<4sHHQQQ")
+    ENTRY = struct.Struct("<II")
+    # Меньше этого мёртвое место не стоит переписывания файла.
+    MIN_COMPACT_SIZE = 64 * 1024
+
+    def __init__(self, path, mode="r"):
+        if mode not in ("r", "a"):
+            raise ValueError("mode must be 'r' or 'a'")
+        self.path = path
+        self.mode = mode
+        if mode == "a" and not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(self._header(0, 0, self.HEADER.size))
+        self._file = open(path, "rb" if mode == "r" else "r+b")
+        self._dirty = False
+        self._read_index()
+
+    def _header(self, index_offset, index_length, end):
+        return self.HEADER.pack(
+            self.MAGIC, self.VERSION, 0, index_offset, index_length, end
+        )
+
+    def _read_index(self):
+        self._file.seek(0)
+        header = self._file.read(self.HEADER.size)
+        if len(header) != self.HEADER.size:
+            raise ValueError("Not a color scheme bundle: %s" % self.path)
+        magic, version, _, index_offset, index_length, end = self.HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("Not a color scheme bundle: %s" % self.path)
+        index = {}
+        self._garbage = 0
+        self._live = 0
+        pos = self.HEADER.size
+        if index_offset:
+            self._file.seek(index_offset)
+            index = json.loads(self._file.read(index_length))
+            index = {name: tuple(o) for name, o in index.items()}
+            self._live = sum(length for _, length in index.values())
+            pos = index_offset + index_length
+        # Журнал читается до конца из заголовка: дальше могут лежать остатки
+        # прерванного append().
+        self._file.seek(pos)
+        while pos < end:
+            name_length, length = self.ENTRY.unpack(self._file.read(self.ENTRY.size))
+            name = self._file.read(name_length).decode("utf-8")
+            offset = pos + self.ENTRY.size + name_length
+            self._replace(index, name, offset, length)
+            pos = offset + length
+            self._file.seek(pos)
+        self._index = index
+        self._index_location = (index_offset, index_length)
+        self._end = end
+
+    def names(self):
+        return list(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, name, cls=ColorScheme):
+        offset, length = self._index[name]
+        self._file.seek(offset)
+        return cls.from_bytes(self._file.read(length))
+
+    def append(self, name, scheme):
+        """Stores the scheme under name, replacing an earlier one with that name."""
+        if self.mode != "a":
+            raise ValueError("Bundle is opened read-only")
+        record = scheme.to_bytes()
+        name_bytes = name.encode("utf-8")
+        offset = self._end + self.ENTRY.size + len(name_bytes)
+        self._file.seek(self._end)
+        self._file.write(self.ENTRY.pack(len(name_bytes), len(record)))
+        self._file.write(name_bytes)
+        self._file.write(record)
+        self._file.flush()
+        # Заголовок меняется последним: до этого журнал заканчивается на прежней записи.
+        self._end = offset + len(record)
+        self._file.seek(0)
+        self._file.write(self._header(*self._index_location, self._end))
+        self._file.flush()
+        self._replace(self._index, name, offset, len(record))
+        self._dirty = True
+        # Сжатие только после того, как заменённых данных накопилось не меньше
+        # живых, поэтому суммарная стоимость переписываний линейна.
+        if self._garbage > max(self._live, self.MIN_COMPACT_SIZE):
+            self.compact()
+
+    def _replace(self, index, name, offset, length):
+        if name in index:
+            old_length = index[name][1]
+            self._garbage += old_length
+            self._live -= old_length
+        index[name] = (offset, length)
+        self._live += length
+
+    def live_size(self):
+        return self._live
+
+    def dead_size(self):
+        """Returns the bytes taken by replaced records."""
+        return self._garbage
+
+    def compact(self):
+        """Rewrites the file without replaced records, with all entries in the index."""
+        if self.mode != "a":
+            raise ValueError("Bundle is opened read-only")
+        tmp_path = self.path + ".tmp"
+        index = {}
+        with open(tmp_path, "wb") as f:
+            f.write(self._header(0, 0, self.HEADER.size))
+            for name, (offset, length) in self._index.items():
+                self._file.seek(offset)
+                index[name] = (f.tell(), length)
+                f.write(self._file.read(length))
+            index_offset = f.tell()
+            data = json.dumps(index).encode("utf-8")
+            f.write(data)
+            end = f.tell()
+            f.seek(0)
+            f.write(self._header(index_offset, len(data), end))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._dirty = False
+        self._read_index()
+
+    def close(self):
+        if self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,102 +1,84 @@
 import wx
 import wx.propgrid
-import dataclasses
-import json
-from typing import List
+import bisect
+import os
 
+from cache import LRUCache
+from history import ADD, COLOR, MOVE, REMOVE, STATE, History
 from ruler import RulerWidget
+from scheme_model import (
+    BINARY_MAGIC,
+    BINARY_VERSION,
+    LUT_SIZE,
+    BaseColorScheme,
+    ColorScheme,
+    FrozenColorScheme,
+    compile_lut,
+    intern_scheme,
+    render_gradient,
+)
+from tasks import BackgroundTask
+
+# Минимальный интервал между перерисовками при перетаскивании, мс (~60 кадров/с).
+FRAME_INTERVAL_MS = 16
+# Имя, под которым GradientEditor регистрируется в сетке свойств.
+GRADIENT_EDITOR = "gradient_editor"
 
 
-@dataclasses.dataclass
-class ColorScheme:
-    schema: List
+def get_interpol_color_by_pos(color_scheme: ColorScheme, pos: float):
+    return wx.Colour(*color_scheme.color_at(pos))
 
-    def min_value(self):
-        return min(map(lambda o: o[3], self.schema))
 
-    def max_value(self):
-        return max(map(lambda o: o[3], self.schema))
+def gradient_bitmap(color_scheme: ColorScheme, width: int, height: int):
+    buffer = render_gradient(color_scheme, width, height)
+    return wx.Bitmap.FromBuffer(width, height, buffer)
 
-    @classmethod
-    def basic(cls, c0: wx.Colour, p0: float, c1: wx.Colour, p1: float):
-        return cls(
-            schema=[
-                (c0.GetRed(), c0.GetGreen(), c0.GetBlue(), p0),
-                (c1.GetRed(), c1.GetGreen(), c1.GetBlue(), p1),
-            ]
-        )
 
-    def range(self):
-        return abs(self.min_value() - self.max_value())
-
-    def save(self, f):
-        f.write(self.to_string())
-
-    @classmethod
-    def load(cls, f):
-        s = f.read()
-        return cls.from_string(s)
-
-    def to_string(self):
-        schema = list(map(lambda o: list(o), self.schema))
-        return json.dumps(schema)
-
-    @classmethod
-    def from_string(cls, json_str: str):
-        schema = json.loads(json_str)
-        schema = list(map(lambda o: (o[0], o[1], o[2], o[3]), schema))
-        return cls(sorted(schema, key=lambda o: o[3]))
-
-    @classmethod
-    def from_paraview(cls, paraview_rgb_list):
-        def chunks(lst, n):
-            """Yield successive n-sized chunks from lst."""
-            for i in range(0, len(lst), n):
-                yield lst[i : i + n]
-
-        schema = []
-        for o in chunks(paraview_rgb_list, 4):
-            schema.append(
-                (
-                    int(255 * o[1]),
-                    int(255 * o[2]),
-                    int(255 * o[3]),
-                    o[0],
-                )
-            )
+_parsed_schemes = LRUCache(maxsize=256)
 
-        return cls(sorted(schema, key=lambda o: o[3]))
-    
-    def to_paraview(self):
-        schema = []
-        for o in self.schema:
-            schema.append(o[3])
-            schema.append(o[0] / 255)
-            schema.append(o[1] / 255)
-            schema.append(o[2] / 255)
-        return schema
 
+def parse_cached(json_str: str) -> ColorScheme:
+    """Returns the scheme parsed from json_str, reusing earlier parses of the same text.
+
+    The returned object is an interned snapshot shared between callers.
+    """
+    color_scheme = _parsed_schemes.get(json_str)
+    if color_scheme is None:
+        color_scheme = intern_scheme(FrozenColorScheme.from_string(json_str))
+        _parsed_schemes.put(json_str, color_scheme)
+    return color_scheme
+
+
+class GradientBitmapCache(LRUCache):
+    """Rendered gradient strips keyed by scheme content, size and device scale.
+
+    Holds wx.Bitmap objects, so it must only be used from the GUI thread.
+    """
+
+    def get_bitmap(self, color_scheme: ColorScheme, width, height, scale=1.0):
+        key = (color_scheme.content_hash(), width, height, scale)
+        bitmap = self.get(key)
+        if bitmap is None:
+            bitmap = gradient_bitmap(
+                color_scheme, max(1, round(width * scale)), max(1, round(height * scale))
+            )
+            if scale != 1.0:
+                bitmap.SetScaleFactor(scale)
+            self.put(key, bitmap)
+        return bitmap
 
-def get_interpol_color_by_pos(color_scheme: ColorScheme, pos: float):
-    if pos < color_scheme.min_value() or pos > color_scheme.max_value():
-        return wx.Colour(0, 0, 0)
-    for i in range(len(color_scheme.schema) - 1):
-        c0 = color_scheme.schema[i]
-        c1 = color_scheme.schema[i + 1]
-    
-        if c0[3] <= pos <= c1[3]:
-            ratio = (pos - c0[3]) / (c1[3] - c0[3])
-            r = int(c0[0] + ratio * (c1[0] - c0[0]))
-            g = int(c0[1] + ratio * (c1[1] - c0[1]))
-            b = int(c0[2] + ratio * (c1[2] - c0[2]))
-            return wx.Colour(r, g, b)
-    return wx.Colour(255, 255, 255)
+
+# Общий кэш градиентов для всех виджетов и ячеек сетки свойств.
+gradient_cache = GradientBitmapCache(maxsize=256)
 
 
 class ColorSchemePicker(wx.Panel):
     def __init__(self, parent, value: ColorScheme, size=wx.DefaultSize):
         super().__init__(parent, size=size)
         self.value = value
+        self.history = History(value)
+        # Перемещения в пределах одного перетаскивания сливаются в один шаг истории.
+        self._merge_moves = False
         sz = wx.BoxSizer(wx.VERTICAL)
         self.ruler = RulerWidget(self, threshold=50)
         sz.Add(self.ruler, 0, wx.EXPAND)
@@ -111,6 +93,19 @@ class ColorSchemePicker(wx.Panel):
         self.dragged_index = None
         self.dragged_last_pos = None
         self.dragged = False
+        # Области, ожидающие перерисовки в следующем кадре.
+        self._dirty_full = False
+        self._dirty_span = None
+        self._flush_call = None
+        # Координаты точек в пикселях для поиска точки под курсором.
+        self._stop_pixels = []
+        self._stop_pixels_value = None
+        self._stop_pixels_key = None
+        # Градиент редактируемой схемы. Он меняется на каждом кадре перетаскивания,
+        # поэтому хранится здесь, а не в общем gradient_cache.
+        self._bitmap = None
+        self._bitmap_value = None
+        self._bitmap_key = None
         self.gradient.Bind(wx.EVT_MOTION, self.on_motion)
         self.gradient.Bind(wx.EVT_SIZE, self.on_size)
         self.gradient.Bind(wx.EVT_PAINT, self.on_paint)
@@ -119,9 +114,92 @@ class ColorSchemePicker(wx.Panel):
         self.gradient.Bind(wx.EVT_ENTER_WINDOW, self.on_enter_window)
         self.gradient.Bind(wx.EVT_RIGHT_DOWN, self.on_right_down)
 
+    def value_to_x(self, p):
+        width = self.gradient.GetSize().GetWidth()
+        return (p - self.value.min_value()) / self.value.range() * width
+
+    def stop_span(self, index):
+        """Returns the pixel columns whose color depends on the stop at index."""
+        last = len(self.value) - 1
+        x0 = self.value_to_x(self.value.stop(max(index - 1, 0))[3])
+        x1 = self.value_to_x(self.value.stop(min(index + 1, last))[3])
+        return int(x0) - 6, int(x1) + 6
+
+    def invalidate(self, x0=None, x1=None):
+        """Queues a repaint of columns x0..x1 (all if omitted) for the next frame."""
+        if x0 is None:
+            self._dirty_full = True
+        elif self._dirty_span is None:
+            self._dirty_span = (x0, x1)
+        else:
+            x0 = min(self._dirty_span[0], x0)
+            x1 = max(self._dirty_span[1], x1)
+            self._dirty_span = (x0, x1)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_call is None:
+            self._flush_call = wx.CallLater(FRAME_INTERVAL_MS, self.flush)
+
+    def flush(self):
+        """Repaints everything queued by invalidate since the last frame."""
+        self._flush_call = None
+        if not self:
+            return
+        if self._dirty_full:
+            self.gradient.Refresh(eraseBackground=False)
+        elif self._dirty_span is not None:
+            x0, x1 = self._dirty_span
+            height = self.gradient.GetSize().GetHeight()
+            self.gradient.RefreshRect(wx.Rect(x0, 0, x1 - x0 + 1, height), False)
+        self._dirty_full = False
+        self._dirty_span = None
+
+    def set_value(self, value):
+        """Replaces the stops with those of value as one undoable step."""
+        old_state = self.value.state()
+        self.value.restore(value.state())
+        self.history.record((STATE, old_state, self.value.state()))
+        self.refresh_all()
+
+    def replace_stops(self, edit):
+        """Runs edit(), which replaces all stops of the value, as one undoable step."""
+        old_state = self.value.state()
+        version = self.value.version
+        result = edit()
+        if self.value.version != version:
+            self.history.record((STATE, old_state, self.value.state()))
+            self.refresh_all()
+        return result
+
+    def set_stop_color(self, index, r, g, b):
+        old_rgb = tuple(self.value.stop(index)[:3])
+        self.value.set_stop_color(index, r, g, b)
+        self.history.record((COLOR, index, old_rgb, tuple(self.value.stop(index)[:3])))
+
+    def add_stop(self, r, g, b, p):
+        index = self.value.add_stop(r, g, b, p)
+        self.history.record((ADD, index, tuple(self.value.stop(index)[:3]), p))
+        return index
+
+    def undo(self):
+        if self.history.undo():
+            self.refresh_all()
+
+    def redo(self):
+        if self.history.redo():
+            self.refresh_all()
+
+    def refresh_all(self):
+        self.ruler.draw()
+        self.gradient.Refresh()
+        self.gradient.Update()
+
     def delete_color(self, index):
-        if 0 <= index < len(self.value.schema):
-            del self.value.schema[index]
+        if 0 <= index < len(self.value):
+            r, g, b, p = self.value.stop(index)
+            self.value.remove_stop(index)
+            self.history.record((REMOVE, index, (r, g, b), p))
             self.ruler.draw()
             self.gradient.Refresh()
             self.gradient.Update()
@@ -152,14 +230,14 @@ class ColorSchemePicker(wx.Panel):
             self.PopupMenu(m, event.GetPosition())
 
     def edit_color(self, index):
-        r, g, b, p = self.value.schema[index]
+        r, g, b, p = self.value.stop(index)
         data = wx.ColourData()
         data.SetColour(wx.Colour(r, g, b))
         data.SetChooseFull(True)
         dlg = wx.ColourDialog(None, data)
         if dlg.ShowModal() == wx.ID_OK:
             c = dlg.GetColourData().GetColour()
-            self.value.schema[index] = (c.GetRed(), c.GetGreen(), c.GetBlue(), p)
+            self.set_stop_color(index, c.GetRed(), c.GetGreen(), c.GetBlue())
             self.gradient.Refresh()
             self.gradient.Update()
 
@@ -174,8 +252,7 @@ class ColorSchemePicker(wx.Panel):
             p = (
                 x / self.gradient.GetSize().GetWidth()
             ) * self.value.range() + self.value.min_value()
-            self.value.schema.append((c.Red(), c.Green(), c.Blue(), p))
-            self.value.schema.sort(key=lambda o: o[3])
+            self.add_stop(c.Red(), c.Green(), c.Blue(), p)
             self.ruler.draw()
             self.gradient.Refresh()
             self.gradient.Update()
@@ -184,10 +261,10 @@ class ColorSchemePicker(wx.Panel):
     def on_enter_window(self, event):
         self.gradient.SetCursor(wx.Cursor(wx.CURSOR_CROSS))
         self.ruler.set_cursor(None)
-        self.gradient.Refresh()
-        self.gradient.Update()
+        self.invalidate()
 
     def on_left_down(self, event):
+        self._merge_moves = False
         self.dragged_index = self.pick_index(event.GetPosition().Get()[0])
         self.dragged_last_pos = event.GetPosition().Get()[0]
 
@@ -208,27 +285,25 @@ class ColorSchemePicker(wx.Panel):
                     p = (
                         x / self.gradient.GetSize().GetWidth()
                     ) * self.value.range() + self.value.min_value()
-                    self.value.schema.append((c.Red(), c.Green(), c.Blue(), p))
-                    self.value.schema.sort(key=lambda o: o[3])
+                    self.add_stop(c.Red(), c.Green(), c.Blue(), p)
                     self.ruler.draw()
                     self.gradient.Refresh()
                     self.gradient.Update()
                 dlg.Destroy()
             else:
-                r, g, b, p = self.value.schema[index]
+                r, g, b, p = self.value.stop(index)
                 data = wx.ColourData()
                 data.SetColour(wx.Colour(r, g, b))
                 data.SetChooseFull(True)
                 dlg = wx.ColourDialog(None, data)
                 if dlg.ShowModal() == wx.ID_OK:
                     c = dlg.GetColourData().GetColour()
-                    self.value.schema[index] = (c.Red(), c.Green(), c.Blue(), p)
+                    self.set_stop_color(index, c.Red(), c.Green(), c.Blue())
                     self.ruler.draw()
                     self.gradient.Refresh()
                     self.gradient.Update()
                 dlg.Destroy()
         else:
-            self.value.schema.sort(key=lambda o: o[3])
             self.Refresh()
             self.Update()
 
@@ -237,13 +312,27 @@ class ColorSchemePicker(wx.Panel):
         if self.gradient.HasCapture():
             self.gradient.ReleaseMouse()
 
-    def pick_index(self, x):
+    def stop_pixels(self):
+        """Returns the sorted x coordinates of the stops, rebuilt on resize or edit."""
         width = self.gradient.GetSize().GetWidth()
-        for i, (r, g, b, p) in enumerate(self.value.schema):
-            pos = (p - self.value.min_value()) * (width / self.value.range())
-            if abs(x - pos) < 5:
-                return i
-        return -1
+        key = (self.value.version, width)
+        if self._stop_pixels_value is not self.value or self._stop_pixels_key != key:
+            scale = width / self.value.range()
+            pixels = (self.value.positions - self.value.min_value()) * scale
+            self._stop_pixels = pixels.tolist()
+            self._stop_pixels_value = self.value
+            self._stop_pixels_key = key
+        return self._stop_pixels
+
+    def pick_index(self, x):
+        """Returns the index of the stop nearest to x within 5 px, or -1."""
+        pixels = self.stop_pixels()
+        i = bisect.bisect_left(pixels, x)
+        index, distance = -1, 5
+        for j in (i - 1, i):
+            if 0 <= j < len(pixels) and abs(x - pixels[j]) < distance:
+                index, distance = j, abs(x - pixels[j])
+        return index
 
     def on_motion(self, event):
         width = self.gradient.GetSize().GetWidth()
@@ -259,11 +348,22 @@ class ColorSchemePicker(wx.Panel):
             x = event.GetPosition().Get()[0] - self.dragged_last_pos
             self.dragged_last_pos = event.GetPosition().Get()[0]
             p = x * (self.value.range() / width)
-            r, g, b, p_old = self.value.schema[self.dragged_index]
-            self.value.schema[self.dragged_index] = (r, g, b, p_old + p)
-            self.ruler.draw()
-            self.gradient.Refresh()
-            self.gradient.Update()
+            p_old = self.value.stop(self.dragged_index)[3]
+            bounds = (self.value.min_value(), self.value.max_value())
+            x0, x1 = self.stop_span(self.dragged_index)
+            old_index = self.dragged_index
+            self.dragged_index = self.value.move_stop(old_index, p_old + p)
+            self.history.record(
+                (MOVE, old_index, p_old, self.dragged_index, p_old + p),
+                merge=self._merge_moves,
+            )
+            self._merge_moves = True
+            if bounds != (self.value.min_value(), self.value.max_value()):
+                # Сдвинулась граница схемы - меняется масштаб всего градиента.
+                self.invalidate()
+            else:
+                self.invalidate(x0, x1)
+                self.invalidate(*self.stop_span(self.dragged_index))
         else:
             if self.pick_index(event.GetPosition().Get()[0]) != -1:
                 self.gradient.SetCursor(wx.Cursor(wx.CURSOR_HAND))
@@ -279,18 +379,7 @@ class ColorSchemePicker(wx.Panel):
         self.gradient.Update()
 
     def get_color(self, value):
-        if value < self.value.min_value() or value > self.value.max_value():
-            return wx.Colour(0, 0, 0)
-        for i in range(len(self.value.schema) - 1):
-            c0 = self.value.schema[i]
-            c1 = self.value.schema[i + 1]
-            if c0[3] <= value <= c1[3]:
-                ratio = (value - c0[3]) / (c1[3] - c0[3])
-                r = int(c0[0] + ratio * (c1[0] - c0[0]))
-                g = int(c0[1] + ratio * (c1[1] - c0[1]))
-                b = int(c0[2] + ratio * (c1[2] - c0[2]))
-                return wx.Colour(r, g, b)
-        return wx.Colour(255, 255, 255)
+        return get_interpol_color_by_pos(self.value, value)
 
     def on_paint(self, event):
         dc = wx.PaintDC(self.gradient)
@@ -300,12 +389,31 @@ class ColorSchemePicker(wx.Panel):
         )
         if width == 0 or height == 0:
             return
-        height = self.gradient.GetSize().GetHeight()
-        for i in range(width):
-            value = self.value.min_value() + (i / width) * self.value.range()
-            color = self.get_color(value)
-            dc.SetPen(wx.Pen(color))
-            dc.DrawLine(i, 0, i, height)
+        self.paint(dc, width, height)
+
+        scale, offset = width / self.value.range(), -self.value.min_value()
+        if (scale, offset) != (self.ruler.pixels_per_unit, self.ruler.offset):
+            self.ruler.set_scale(scale, draw=False)
+            self.ruler.set_offset(offset, draw=False)
+            self.ruler.Refresh(eraseBackground=False)
+
+    def gradient_bitmap(self, width, height):
+        """Returns the gradient of the value, redrawn when it is edited or resized."""
+        scale = self.gradient.GetContentScaleFactor()
+        key = (self.value.version, width, height, scale)
+        if self._bitmap_value is not self.value or self._bitmap_key != key:
+            self._bitmap = gradient_bitmap(
+                self.value, max(1, round(width * scale)), max(1, round(height * scale))
+            )
+            if scale != 1.0:
+                self._bitmap.SetScaleFactor(scale)
+            self._bitmap_value = self.value
+            self._bitmap_key = key
+        return self._bitmap
+
+    def paint(self, dc, width, height):
+        """Draws the gradient and the stop markers onto any DC."""
+        dc.DrawBitmap(self.gradient_bitmap(width, height), 0, 0)
 
         for r, g, b, p in self.value.schema:
             x = int((p - self.value.min_value()) / self.value.range() * width)
@@ -314,13 +422,16 @@ class ColorSchemePicker(wx.Panel):
             )
             dc.DrawRectangle(int(x - 5), int(height / 2 - 5), 10, 10)
 
-        self.ruler.set_scale(width / self.value.range(), draw=False)
-        self.ruler.set_offset(-self.value.min_value())
-        self.ruler.draw()
-
 
 class ColorSchemeDialog(wx.Dialog):
-    def __init__(self, parent, value: ColorScheme):
+    """Editor of a color scheme.
+
+    The picker edits a private mutable copy of value. get_value() returns the
+    original snapshot until Apply is pressed and an interned snapshot of the
+    edited copy after that.
+    """
+
+    def __init__(self, parent, value: ColorScheme, presets=None):
         super().__init__(
             parent,
             title="Настройка цветовой схемы",
@@ -328,7 +439,8 @@ class ColorSchemeDialog(wx.Dialog):
             size=wx.Size(400, 180),
         )
         sz = wx.BoxSizer(wx.VERTICAL)
-        self.picker = ColorSchemePicker(self, value, size=wx.Size(350, 50))
+        self.value = value
+        self.picker = ColorSchemePicker(self, value.thaw(), size=wx.Size(350, 50))
         sz.Add(self.picker, 0, wx.EXPAND | wx.BOTTOM, 10)
         self.cp = wx.CollapsiblePane(self, label="Масштабирование")
         pane = self.cp.GetPane()
@@ -336,12 +448,12 @@ class ColorSchemeDialog(wx.Dialog):
         label = wx.StaticText(pane, label="От")
         p_sz.Add(label)
         self.min_field = wx.SpinCtrlDouble(pane, min=-1000000, max=10000000)
-        self.min_field.SetValue(self.get_value().min_value())
+        self.min_field.SetValue(value.min_value())
         p_sz.Add(self.min_field, 0, wx.EXPAND)
         label = wx.StaticText(pane, label="До")
         p_sz.Add(label)
         self.max_field = wx.SpinCtrlDouble(pane, min=-10000000, max=100000000)
-        self.max_field.SetValue(self.get_value().max_value())
+        self.max_field.SetValue(value.max_value())
         p_sz.Add(self.max_field, 0, wx.EXPAND | wx.BOTTOM, border=10)
         self.scale_btn = wx.Button(pane, label="Масштабировать")
         p_sz.Add(self.scale_btn, 0, wx.BOTTOM, border=10)
@@ -350,10 +462,22 @@ class ColorSchemeDialog(wx.Dialog):
         btn_sz = wx.BoxSizer(wx.HORIZONTAL)
         self.btn_load = wx.Button(self, wx.ID_OPEN, "Загрузить")
         self.btn_save = wx.Button(self, wx.ID_SAVE, "Сохранить")
+        self.btn_simplify = wx.Button(self, label="Упростить")
+        self.btn_undo = wx.Button(self, wx.ID_UNDO, "Назад")
+        self.btn_redo = wx.Button(self, wx.ID_REDO, "Вперёд")
+        self.presets = presets
+        self.btn_presets = wx.Button(self, label="Пресеты...")
+        self.btn_presets.Bind(wx.EVT_BUTTON, self.on_presets)
+        self.btn_presets.Show(presets is not None)
         self.btn_load.Bind(wx.EVT_BUTTON, self.on_load)
         self.btn_save.Bind(wx.EVT_BUTTON, self.on_save)
+        self.btn_simplify.Bind(wx.EVT_BUTTON, self.on_simplify)
         btn_sz.Add(self.btn_load)
-        btn_sz.Add(self.btn_save, 1, wx.RIGHT, border=20)
+        btn_sz.Add(self.btn_save)
+        btn_sz.Add(self.btn_presets)
+        btn_sz.Add(self.btn_undo)
+        btn_sz.Add(self.btn_redo)
+        btn_sz.Add(self.btn_simplify, 1, wx.RIGHT, border=20)
         sz.Add(btn_sz, 0, wx.EXPAND | wx.LEFT | wx.RIGHT | wx.BOTTOM, 10)
         btn_sz.AddStretchSpacer()
         self.btn_cancel = wx.Button(self, label="Отменить")
@@ -365,34 +489,141 @@ class ColorSchemeDialog(wx.Dialog):
         btn_sz.Add(self.btn_apply, 0, wx.EXPAND)
         self.SetSizer(sz)
         self.Layout()
+        self.task = None
+        self.Bind(wx.EVT_MENU, self.on_undo, id=wx.ID_UNDO)
+        self.Bind(wx.EVT_MENU, self.on_redo, id=wx.ID_REDO)
+        self.Bind(wx.EVT_BUTTON, self.on_undo, id=wx.ID_UNDO)
+        self.Bind(wx.EVT_BUTTON, self.on_redo, id=wx.ID_REDO)
+        self.Bind(wx.EVT_UPDATE_UI, self.on_update_undo, id=wx.ID_UNDO)
+        self.Bind(wx.EVT_UPDATE_UI, self.on_update_redo, id=wx.ID_REDO)
+        self.SetAcceleratorTable(
+            wx.AcceleratorTable(
+                [
+                    (wx.ACCEL_CTRL, ord("Z"), wx.ID_UNDO),
+                    (wx.ACCEL_CTRL, ord("Y"), wx.ID_REDO),
+                    (wx.ACCEL_CTRL | wx.ACCEL_SHIFT, ord("Z"), wx.ID_REDO),
+                ]
+            )
+        )
+
+    def on_undo(self, event):
+        self.picker.undo()
+
+    def on_redo(self, event):
+        self.picker.redo()
+
+    def on_update_undo(self, event):
+        event.Enable(self.picker.history.can_undo())
+
+    def on_update_redo(self, event):
+        event.Enable(self.picker.history.can_redo())
 
     def on_apply(self, event):
+        if self.task is not None:
+            self.task.cancel()
+        self.value = intern_scheme(self.picker.value)
         self.EndModal(wx.ID_OK)
 
     def on_cancel(self, event):
+        if self.task is not None:
+            self.task.cancel()
         self.EndModal(wx.ID_CANCEL)
 
     def get_value(self):
-        return self.picker.value
+        return self.value
+
+    def on_simplify(self, event):
+        with wx.TextEntryDialog(
+            self,
+            "Допустимое отклонение цвета (ΔE):",
+            "Упрощение цветовой схемы",
+            value="1.0",
+        ) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            try:
+                tolerance = float(dlg.GetValue().replace(",", "."))
+            except ValueError:
+                wx.MessageBox("Введите число.", "Ошибка", wx.OK | wx.ICON_ERROR)
+                return
+        removed = self.picker.replace_stops(
+            lambda: self.picker.value.simplify(tolerance)
+        )
+        wx.MessageBox(
+            "Удалено точек: %d, осталось: %d" % (removed, len(self.picker.value)),
+            "Упрощение цветовой схемы",
+            wx.OK | wx.ICON_INFORMATION,
+        )
+
+    def on_presets(self, event):
+        from preset_gallery import PresetBrowserDialog
+
+        with PresetBrowserDialog(self, self.presets) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            name = dlg.get_name()
+        self.run_task(
+            lambda task: self.presets.scheme(name), self.set_loaded_value, "Загрузка пресета"
+        )
 
     def on_save(self, event):
         wildcard = (
-            "Color Scheme Files (*.colorscheme)|*.colorscheme|All files (*.*)|*.*"
+            "Color Scheme Files (*.colorscheme)|*.colorscheme|"
+            "Binary Color Scheme Files (*.colorscheme)|*.colorscheme|"
+            "Color Scheme Bundles (*.csbundle)|*.csbundle|"
+            "All files (*.*)|*.*"
         )
 
         with wx.FileDialog(
             self,
             message="Сохранить цветовую схему",
             wildcard=wildcard,
-            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+            style=wx.FD_SAVE,
         ) as dlg:
-            if dlg.ShowModal() == wx.ID_OK:
-                with open(dlg.GetPath(), "w") as f:
-                    self.picker.value.save(f)
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            path = dlg.GetPath()
+            if dlg.GetFilterIndex() == 2 or path.endswith(".csbundle"):
+                self.save_to_bundle(path)
+                return
+            if os.path.exists(path) and wx.MessageBox(
+                "Файл уже существует. Заменить?",
+                "Сохранить цветовую схему",
+                wx.YES_NO | wx.ICON_QUESTION,
+            ) != wx.YES:
+                return
+            binary = dlg.GetFilterIndex() == 1
+        # Сохраняется снимок: пока файл пишется, схему можно продолжать редактировать.
+        value = self.picker.value.freeze()
+
+        def save(task):
+            with open(path, "wb" if binary else "w") as f:
+                value.save(f, binary=binary)
+
+        self.run_task(save, None, "Сохранение цветовой схемы")
+
+    def save_to_bundle(self, path):
+        from bundle import SchemeBundle
+
+        with wx.TextEntryDialog(
+            self, "Имя схемы в наборе:", "Сохранить в набор"
+        ) as dlg:
+            if dlg.ShowModal() != wx.ID_OK or not dlg.GetValue():
+                return
+            name = dlg.GetValue()
+        value = self.picker.value.freeze()
+
+        def save(task):
+            with SchemeBundle(path, "a") as bundle:
+                bundle.append(name, value)
+
+        self.run_task(save, None, "Сохранение цветовой схемы")
 
     def on_load(self, event):
         wildcard = (
-            "Color Scheme Files (*.colorscheme)|*.colorscheme|All files (*.*)|*.*"
+            "Color Scheme Files (*.colorscheme)|*.colorscheme|"
+            "Color Scheme Bundles (*.csbundle)|*.csbundle|"
+            "All files (*.*)|*.*"
         )
 
         with wx.FileDialog(
@@ -401,11 +632,49 @@ class ColorSchemeDialog(wx.Dialog):
             wildcard=wildcard,
             style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
         ) as dlg:
-            if dlg.ShowModal() == wx.ID_OK:
-                with open(dlg.GetPath(), "r") as f:
-                    self.picker.value = ColorScheme.load(f)
-                    self.picker.Refresh()
-                    self.picker.Update()
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            path = dlg.GetPath()
+        if path.endswith(".csbundle"):
+            self.load_from_bundle(path)
+        else:
+            self.run_task(
+                lambda task: ColorScheme.load_file(path),
+                self.set_loaded_value,
+                "Загрузка цветовой схемы",
+            )
+
+    def load_from_bundle(self, path):
+        from bundle import SchemeBundle
+
+        def read_names(task):
+            with SchemeBundle(path) as bundle:
+                return bundle.names()
+
+        def choose(names):
+            with wx.SingleChoiceDialog(
+                self, "Выберите схему:", "Открыть из набора", names
+            ) as dlg:
+                if dlg.ShowModal() != wx.ID_OK:
+                    return
+                name = names[dlg.GetSelection()]
+
+            def read_scheme(task):
+                with SchemeBundle(path) as bundle:
+                    return bundle.get(name)
+
+            self.run_task(read_scheme, self.set_loaded_value, "Загрузка цветовой схемы")
+
+        self.run_task(read_names, choose, "Загрузка цветовой схемы")
+
+    def set_loaded_value(self, value):
+        self.picker.set_value(value)
+
+    def run_task(self, func, on_done, title):
+        """Runs file I/O in a worker thread, a new task cancels the previous one."""
+        if self.task is not None:
+            self.task.cancel()
+        self.task = BackgroundTask(func, on_done, parent=self, title=title).start()
 
 
 class GradientPanel(wx.Panel):
@@ -435,16 +704,10 @@ class GradientPanel(wx.Panel):
 
         if width == 0 or height == 0:
             return
-        for i in range(width):
-            value = self.value.min_value() + (i / width) * self.value.range()
-            color = get_interpol_color_by_pos(self.value, value)
-            dc.SetPen(wx.Pen(color))
-            dc.DrawLine(
-                i + rect.GetLeft(),
-                rect.GetTop(),
-                i + rect.GetLeft(),
-                height + rect.GetTop(),
-            )
+        bitmap = gradient_cache.get_bitmap(
+            self.value, width, height, panel.GetContentScaleFactor()
+        )
+        dc.DrawBitmap(bitmap, rect.GetLeft(), rect.GetTop())
 
     def set_color_scheme(self, color_scheme):
         self.value = color_scheme
@@ -469,25 +732,18 @@ class GradientEditor(wx.propgrid.PGEditor):
         ctrl.set_color_scheme(property.GetValue())
 
     def get_color(self, scheme, value):
-        if value < scheme.min_value() or value > scheme.max_value():
-            return wx.Colour(0, 0, 0)
-        for i in range(len(scheme.schema) - 1):
-            c0 = scheme.schema[i]
-            c1 = scheme.schema[i + 1]
-            if c0[3] <= value <= c1[3]:
-                ratio = (value - c0[3]) / (c1[3] - c0[3])
-                r = int(c0[0] + ratio * (c1[0] - c0[0]))
-                g = int(c0[1] + ratio * (c1[1] - c0[1]))
-                b = int(c0[2] + ratio * (c1[2] - c0[2]))
-                return wx.Colour(r, g, b)
-        return wx.Colour(255, 255, 255)
+        return get_interpol_color_by_pos(scheme, value)
 
     def DrawValue(self, dc, rect, property, text):
-        propvalue = ColorScheme.from_string(text)
-        stops = getattr(propvalue, "schema")
+        propvalue = property.GetValue() if property is not None else None
+        if propvalue is None:
+            propvalue = parse_cached(text)
+        self.draw_scheme(dc, rect, propvalue)
+
+    def draw_scheme(self, dc, rect, propvalue: ColorScheme):
         self.value = propvalue
 
-        if not stops or len(stops) < 2:
+        if propvalue is None or len(propvalue) < 2:
             dc.SetBrush(wx.Brush(wx.WHITE))
             dc.DrawRectangle(rect)
             return
@@ -498,16 +754,10 @@ class GradientEditor(wx.propgrid.PGEditor):
         # Рисуем градиент слева направо
         if width == 0 or height == 0:
             return
-        for i in range(width):
-            value = propvalue.min_value() + (i / width) * propvalue.range()
-            color = self.get_color(propvalue, value)
-            dc.SetPen(wx.Pen(color))
-            dc.DrawLine(
-                i + rect.GetLeft(),
-                rect.GetTop(),
-                i + rect.GetLeft(),
-                height + rect.GetTop(),
-            )
+        bitmap = gradient_cache.get_bitmap(
+            propvalue, width, height, dc.GetContentScaleFactor()
+        )
+        dc.DrawBitmap(bitmap, rect.GetLeft(), rect.GetTop())
 
     def OnPaint(self, event):
         if self.value is None:
@@ -518,7 +768,7 @@ class GradientEditor(wx.propgrid.PGEditor):
         rect: wx.Rect = panel.GetClientRect()
         rect.Deflate(0, 2)
 
-        self.DrawValue(dc, rect, None, self.value.to_string())
+        self.draw_scheme(dc, rect, self.value)
 
     def OnEvent(
         self,
@@ -538,9 +788,17 @@ class GradientEditor(wx.propgrid.PGEditor):
 
 
 class ColorSchemeProperty(wx.propgrid.PGProperty):
-    def __init__(self, label, name, value=None):
+    """Property holding a ColorScheme, edited with the editor registered as
+    GRADIENT_EDITOR, so rows need no SetPropertyEditor call of their own."""
+
+    def __init__(self, label, name, value=None, presets=None):
         super().__init__(label, name)
-        self.SetValue(value)
+        self.presets = presets
+        self.SetValue(intern_scheme(value) if value is not None else None)
+
+    def DoGetEditorClass(self):
+        editor = wx.propgrid.PropertyGridInterface.GetEditorByName(GRADIENT_EDITOR)
+        return editor if editor is not None else super().DoGetEditorClass()
 
     def GetValueAsString(self, argFlags=0):
         return self.GetValue().to_string()
@@ -552,7 +810,7 @@ class ColorSchemeProperty(wx.propgrid.PGProperty):
         event: wx.Event,
     ) -> bool:
         if event.GetEventType() == wx.wxEVT_BUTTON:
-            dlg = ColorSchemeDialog(propgrid, self.GetValue())
+            dlg = ColorSchemeDialog(propgrid, self.GetValue(), self.presets)
             if dlg.ShowModal() == wx.ID_OK:
                 self.SetValue(dlg.get_value())
         return True
@@ -0,0 +1,200 @@
+"""Color interpolation in the color spaces used by ParaView presets.
+
+Everything here works on numpy arrays and does not depend on wx, colors are
+8 bit sRGB values in (n, 3) arrays.
+"""
+
+import numpy as np
+
+RGB = "RGB"
+LAB = "Lab"
+DIVERGING = "Diverging"
+
+# Названия пространств в файлах ParaView и соответствующие им режимы интерполяции.
+_ALIASES = {
+    "RGB": RGB,
+    "Lab": LAB,
+    "CIELAB": LAB,
+    "Lab/CIEDE2000": LAB,
+    "Diverging": DIVERGING,
+    "Msh": DIVERGING,
+}
+
+_RGB_TO_XYZ = np.array(
+    [
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ]
+)
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+# Сколько точек каждого исходного интервала проверяет decimate_stops: ошибка
+# RGB и Msh интерполяции бывает наибольшей не в узлах и не в середине.
+DECIMATE_SAMPLES = 8
+
+
+def interpolation_space(color_space):
+    """Returns RGB, LAB or DIVERGING for a ParaView ColorSpace name."""
+    return _ALIASES.get(color_space, RGB)
+
+
+def rgb_to_lab(rgb):
+    """Converts 8 bit sRGB colors to CIE L*a*b* (D65)."""
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def lab_to_rgb(lab):
+    """Converts CIE L*a*b* colors to sRGB as floats in 0..255, out of gamut clipped."""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f > 0.206893, f**3, (f - 16 / 116) / 7.787) * _WHITE
+    linear = np.clip(xyz @ _XYZ_TO_RGB.T, 0, 1)
+    c = np.where(
+        linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055
+    )
+    return np.clip(c * 255, 0, 255)
+
+
+def lab_to_msh(lab):
+    m = np.sqrt(np.sum(lab**2, axis=-1))
+    s = np.arccos(np.divide(lab[..., 0], m, out=np.ones_like(m), where=m > 0))
+    h = np.arctan2(lab[..., 2], lab[..., 1])
+    return np.stack([m, s, h], axis=-1)
+
+
+def msh_to_lab(msh):
+    m, s, h = msh[..., 0], msh[..., 1], msh[..., 2]
+    return np.stack(
+        [m * np.cos(s), m * np.sin(s) * np.cos(h), m * np.sin(s) * np.sin(h)], axis=-1
+    )
+
+
+def _adjust_hue(msh, m_unsat):
+    """Hue for an unsaturated end of a segment (Moreland, 2009)."""
+    m, s, h = msh[..., 0], msh[..., 1], msh[..., 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spin = s * np.sqrt(np.maximum(m_unsat**2 - m**2, 0)) / (m * np.sin(s))
+    spin = np.nan_to_num(spin)
+    adjusted = np.where(h > -np.pi / 3, h + spin, h - spin)
+    return np.where(m >= m_unsat, h, adjusted)
+
+
+def _interpolate_msh(msh0, msh1, t):
+    """Moreland's diverging interpolation between pairs of Msh colors."""
+    msh0 = msh0.copy()
+    msh1 = msh1.copy()
+    t = t.copy()
+    saturated = (msh0[:, 1] > 0.05) & (msh1[:, 1] > 0.05)
+    hue_diff = np.abs(msh0[:, 2] - msh1[:, 2])
+    hue_diff = np.where(hue_diff > np.pi, 2 * np.pi - hue_diff, hue_diff)
+    # Сильно различающиеся насыщенные цвета соединяются через белую середину.
+    split = saturated & (hue_diff > np.pi / 3)
+    if split.any():
+        white = np.zeros((len(t), 3))
+        white[:, 0] = np.maximum(np.maximum(msh0[:, 0], msh1[:, 0]), 88)
+        first = split & (t < 0.5)
+        second = split & (t >= 0.5)
+        msh1[first] = white[first]
+        t[first] = 2 * t[first]
+        msh0[second] = white[second]
+        t[second] = 2 * t[second] - 1
+    unsat0 = (msh0[:, 1] < 0.05) & (msh1[:, 1] > 0.05)
+    unsat1 = (msh1[:, 1] < 0.05) & (msh0[:, 1] > 0.05)
+    msh0[:, 2] = np.where(unsat0, _adjust_hue(msh1, msh0[:, 0]), msh0[:, 2])
+    msh1[:, 2] = np.where(unsat1, _adjust_hue(msh0, msh1[:, 0]), msh1[:, 2])
+    return msh0 + t[:, np.newaxis] * (msh1 - msh0)
+
+
+def interpolate_colors(positions, colors, values, color_space=RGB):
+    """Returns the (n, 3) uint8 colors at values, clipped to the stop range.
+
+    positions must be sorted. RGB interpolation truncates like the original
+    8 bit code did, Lab and Diverging round to the nearest value.
+    """
+    space = interpolation_space(color_space)
+    if space == DIVERGING and len(positions) < 2:
+        space = LAB
+    rgb = _interpolate(positions, colors, values, space)
+    if space == RGB:
+        return rgb.astype(np.uint8)
+    return (rgb + 0.5).astype(np.uint8)
+
+
+def _interpolate(positions, colors, values, space):
+    """Same as interpolate_colors, but returns float RGB before rounding."""
+    positions = np.asarray(positions, dtype=np.float64)
+    values = np.clip(np.asarray(values, dtype=np.float64), positions[0], positions[-1])
+    if space == RGB:
+        colors = np.asarray(colors, dtype=np.float64)
+        out = np.empty(values.shape + (3,))
+        for c in range(3):
+            out[..., c] = np.interp(values, positions, colors[:, c])
+        return np.clip(out, 0, 255)
+
+    lab = rgb_to_lab(colors)
+    if space == LAB:
+        result = np.stack(
+            [np.interp(values, positions, lab[:, c]) for c in range(3)], axis=-1
+        )
+        return lab_to_rgb(result)
+
+    flat = values.ravel()
+    i = np.searchsorted(positions, flat, side="right") - 1
+    np.clip(i, 0, len(positions) - 2, out=i)
+    span = positions[i + 1] - positions[i]
+    t = np.divide(flat - positions[i], span, out=np.zeros_like(flat), where=span > 0)
+    msh = lab_to_msh(lab)
+    result = msh_to_lab(_interpolate_msh(msh[i], msh[i + 1], t))
+    return lab_to_rgb(result).reshape(values.shape + (3,))
+
+
+def decimate_stops(positions, colors, color_space=RGB, tolerance=1.0):
+    """Returns the indices of the stops to keep with color error under tolerance.
+
+    Stops are dropped greedily: a run of stops is replaced by its two ends as
+    long as the interpolated colors at DECIMATE_SAMPLES points of every
+    original interval differ from the original ones by at most tolerance
+    (CIE76 delta E). Colors are compared before rounding to 8 bit, the
+    rounding of both schemes adds up to one unit per channel on top.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    colors = np.asarray(colors)
+    n = len(positions)
+    if n <= 2:
+        return np.arange(n)
+    space = interpolation_space(color_space)
+    k = DECIMATE_SAMPLES
+    samples = positions[:-1, np.newaxis] + np.diff(positions)[:, np.newaxis] * (
+        np.arange(k) / k
+    )
+    samples = np.append(samples.ravel(), positions[-1])
+    reference = rgb_to_lab(_interpolate(positions, colors, samples, space))
+
+    def fits(start, end):
+        span = samples[k * start : k * end + 1]
+        ends = [start, end]
+        approx = _interpolate(positions[ends], colors[ends], span, space)
+        error = rgb_to_lab(approx) - reference[k * start : k * end + 1]
+        return np.linalg.norm(error, axis=-1).max() <= tolerance
+
+    keep = [0]
+    anchor = 0
+    end = 2
+    while end < n:
+        if positions[end] == positions[anchor] or not fits(anchor, end):
+            anchor = end - 1
+            keep.append(anchor)
+        end += 1
+    keep.append(n - 1)
+    return np.array(keep)
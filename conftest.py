@@ -0,0 +1,2 @@
+# Корень репозитория попадает в sys.path вместе с этим файлом, поэтому тесты
+# импортируют модули приложения так же, как main.py.
@@ -0,0 +1,93 @@
+from collections import deque
+
+# Шаги истории - кортежи, первый элемент которых - вид правки:
+#   ("move", old_index, old_p, new_index, new_p)
+#   ("color", index, old_rgb, new_rgb)
+#   ("add", index, rgb, p)
+#   ("remove", index, rgb, p)
+#   ("state", old_state, new_state) - замена всех точек сразу, см. ColorScheme.state()
+MOVE = "move"
+COLOR = "color"
+ADD = "add"
+REMOVE = "remove"
+STATE = "state"
+
+
+class History:
+    """Undo/redo history of the edits of one ColorScheme.
+
+    Steps are small tuples describing a single edit, not copies of the
+    scheme, so a step takes the same memory however many stops the scheme
+    has. Replaying a step costs as much as the edit itself. Stops are put
+    back at their recorded indices, so stops sharing a position keep their
+    order. At most maxlen steps are kept, the oldest are dropped first.
+    """
+
+    def __init__(self, scheme, maxlen=200):
+        self.scheme = scheme
+        self._undo = deque(maxlen=maxlen)
+        self._redo = []
+
+    def record(self, step, merge=False):
+        """Adds a step made on the scheme and clears the redo steps.
+
+        With merge=True a move continuing the last recorded move of the same
+        stop is folded into it, so a whole drag is undone at once.
+        """
+        self._redo.clear()
+        if merge and step[0] == MOVE and self._undo:
+            last = self._undo[-1]
+            if last[0] == MOVE and last[3] == step[1]:
+                self._undo[-1] = (MOVE, last[1], last[2], step[3], step[4])
+                return
+        self._undo.append(step)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self) -> bool:
+        if not self._undo:
+            return False
+        step = self._undo.pop()
+        self._apply(step, reverse=True)
+        self._redo.append(step)
+        return True
+
+    def redo(self) -> bool:
+        if not self._redo:
+            return False
+        step = self._redo.pop()
+        self._apply(step, reverse=False)
+        self._undo.append(step)
+        return True
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def _apply(self, step, reverse):
+        scheme = self.scheme
+        kind = step[0]
+        if kind == MOVE:
+            _, old_index, old_p, new_index, new_p = step
+            if reverse:
+                scheme.move_stop(new_index, old_p, old_index)
+            else:
+                scheme.move_stop(old_index, new_p, new_index)
+        elif kind == COLOR:
+            _, index, old_rgb, new_rgb = step
+            scheme.set_stop_color(index, *(old_rgb if reverse else new_rgb))
+        elif kind in (ADD, REMOVE):
+            _, index, rgb, p = step
+            if (kind == ADD) == reverse:
+                scheme.remove_stop(index)
+            else:
+                scheme.insert_stop(index, *rgb, p)
+        elif kind == STATE:
+            _, old_state, new_state = step
+            scheme.restore(old_state if reverse else new_state)
+        else:
+            raise ValueError("Unknown history step: %r" % (kind,))
@@ -0,0 +1,290 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import wx
+
+from cache import LRUCache
+from scheme_model import render_gradient
+from tasks import BackgroundTask
+
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_HEIGHT = 16
+
+
+class ThumbnailRenderer:
+    """Renders preset gradients into pixel buffers in a thread pool.
+
+    Rendering is pure NumPy, buffers are (height, width, 3) uint8 arrays kept
+    in a bounded cache by preset name. Nothing here touches wx except the
+    wx.CallAfter used to report finished thumbnails.
+    """
+
+    def __init__(self, library, width, height, workers=None, maxsize=4096):
+        self.library = library
+        self.width = width
+        self.height = height
+        self.buffers = LRUCache(maxsize)
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="thumbnails"
+        )
+        self._pending = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def request(self, name, on_ready):
+        """Returns the buffer for name, or None and queues it for rendering.
+
+        on_ready(name) is called on the GUI thread when the buffer is in the cache.
+        """
+        buffer = self.buffers.get(name)
+        if buffer is not None:
+            return buffer
+        with self._lock:
+            if name in self._pending or name in self._failed:
+                return None
+            future = self._executor.submit(self._render, name)
+            self._pending[name] = future
+        # Вне блокировки: для уже завершённой задачи колбэк вызывается сразу.
+        future.add_done_callback(lambda f: self._done(name, f, on_ready))
+        return None
+
+    def _render(self, name):
+        scheme = self.library.scheme(name)
+        return render_gradient(scheme, self.width, self.height)
+
+    def _done(self, name, future, on_ready):
+        with self._lock:
+            # Отброшенная, но уже начатая задача не должна снять новую для того же имени.
+            if self._pending.get(name) is future:
+                del self._pending[name]
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                # Пресет без точек или с ошибкой в файле остаётся без миниатюры.
+                self._failed.add(name)
+                return
+        self.buffers.put(name, future.result())
+        wx.CallAfter(on_ready, name)
+
+    def discard_pending(self, keep):
+        """Cancels queued thumbnails whose names are not in keep."""
+        with self._lock:
+            discarded = [
+                self._pending.pop(name) for name in list(self._pending) if name not in keep
+            ]
+        # cancel() сразу вызывает _done, которому нужна та же блокировка. Уже
+        # начатые миниатюры не отменяются, _done положит их в кэш как обычно.
+        for future in discarded:
+            future.cancel()
+
+    def shutdown(self, wait=False):
+        """Cancels queued thumbnails, with wait=True also waits for running ones."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class PresetGallery(wx.VListBox):
+    """Virtual list of presets drawn as gradient thumbnails with their names.
+
+    Only visible rows are drawn. Thumbnails come from a ThumbnailRenderer and
+    are converted to bitmaps on first paint, the bitmaps are kept in a
+    bounded cache of their own.
+    """
+
+    def __init__(self, parent, library, names=(), size=wx.DefaultSize):
+        super().__init__(parent, size=size)
+        self.library = library
+        self.scale = self.GetContentScaleFactor()
+        self.renderer = ThumbnailRenderer(
+            library,
+            max(1, round(THUMBNAIL_WIDTH * self.scale)),
+            max(1, round(THUMBNAIL_HEIGHT * self.scale)),
+        )
+        self.bitmaps = LRUCache(maxsize=512)
+        self.descriptions = LRUCache(maxsize=512)
+        self.row_height = THUMBNAIL_HEIGHT + 8
+        self.set_names(names)
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+
+    def set_names(self, names):
+        self.names = list(names)
+        self.rows = {name: i for i, name in enumerate(self.names)}
+        self.SetItemCount(len(self.names))
+        self.Refresh()
+
+    def get_selected_name(self):
+        n = self.GetSelection()
+        return self.names[n] if n != wx.NOT_FOUND else None
+
+    def visible_names(self):
+        begin = self.GetVisibleRowsBegin()
+        end = min(self.GetVisibleRowsEnd() + 1, len(self.names))
+        return set(self.names[begin:end])
+
+    def on_paint(self, event):
+        # Миниатюры, прокрученные за пределы окна до начала отрисовки, не нужны.
+        self.renderer.discard_pending(self.visible_names())
+        event.Skip()
+
+    def on_destroy(self, event):
+        if event.GetEventObject() is self:
+            self.renderer.shutdown()
+        event.Skip()
+
+    def on_thumbnail_ready(self, name):
+        if not self:
+            return
+        n = self.rows.get(name)
+        if n is not None and self.IsVisible(n):
+            self.RefreshRow(n)
+
+    def thumbnail(self, name):
+        bitmap = self.bitmaps.get(name)
+        if bitmap is None:
+            buffer = self.renderer.request(name, self.on_thumbnail_ready)
+            if buffer is None:
+                return None
+            bitmap = wx.Bitmap.FromBuffer(buffer.shape[1], buffer.shape[0], buffer)
+            if self.scale != 1.0:
+                bitmap.SetScaleFactor(self.scale)
+            self.bitmaps.put(name, bitmap)
+        return bitmap
+
+    def description(self, name):
+        """Returns the metadata line of a row, read from the library on first paint."""
+        text = self.descriptions.get(name)
+        if text is None:
+            try:
+                count, color_space, v_min, v_max = self.library.info(name)
+                text = "%d точ., %s, %g … %g" % (count, color_space, v_min, v_max)
+            except (KeyError, ValueError):
+                text = ""
+            self.descriptions.put(name, text)
+        return text
+
+    def OnMeasureItem(self, n):
+        return self.row_height
+
+    def OnDrawItem(self, dc, rect, n):
+        name = self.names[n]
+        x, y = rect.x + 4, rect.y + 4
+        bitmap = self.thumbnail(name)
+        if bitmap is not None:
+            dc.DrawBitmap(bitmap, x, y)
+        else:
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(wx.Brush(wx.Colour(230, 230, 230)))
+            dc.DrawRectangle(x, y, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
+        if self.IsSelected(n):
+            colour = wx.SystemSettings.GetColour(wx.SYS_COLOUR_HIGHLIGHTTEXT)
+        else:
+            colour = wx.SystemSettings.GetColour(wx.SYS_COLOUR_LISTBOXTEXT)
+        dc.SetTextForeground(colour)
+        text_h = dc.GetTextExtent(name)[1]
+        text_y = rect.y + (rect.height - text_h) // 2
+        dc.DrawText(name, x + THUMBNAIL_WIDTH + 8, text_y)
+        description = self.description(name)
+        if description:
+            text_w = dc.GetTextExtent(description)[0]
+            dc.SetTextForeground(wx.Colour(128, 128, 128))
+            dc.DrawText(description, rect.GetRight() - text_w - 4, text_y)
+
+
+class PresetBrowserDialog(wx.Dialog):
+    """Searchable list of every preset of a PresetLibrary.
+
+    The dialog opens with an empty list and fills it once the preset names
+    have been read in the background. Filtering works on the in-memory list
+    of names: typing more characters narrows the previous result instead of
+    starting over.
+    """
+
+    def __init__(self, parent, library):
+        super().__init__(
+            parent,
+            title="Пресеты",
+            style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER,
+            size=wx.Size(560, 480),
+        )
+        self.library = library
+        self.all_names = []
+        self.lower_names = {}
+        self.filter_text = ""
+        self.filtered = []
+        sz = wx.BoxSizer(wx.VERTICAL)
+        self.search = wx.SearchCtrl(self)
+        self.search.ShowCancelButton(True)
+        self.search.Bind(wx.EVT_TEXT, self.on_filter)
+        self.search.Bind(wx.EVT_SEARCHCTRL_CANCEL_BTN, self.on_clear_filter)
+        sz.Add(self.search, 0, wx.EXPAND | wx.ALL, 10)
+        self.gallery = PresetGallery(self, library)
+        self.gallery.Bind(wx.EVT_LISTBOX_DCLICK, self.on_apply)
+        sz.Add(self.gallery, 1, wx.EXPAND | wx.LEFT | wx.RIGHT, 10)
+        btn_sz = wx.BoxSizer(wx.HORIZONTAL)
+        self.status = wx.StaticText(self, label="Загрузка...")
+        btn_sz.Add(self.status, 0, wx.ALIGN_CENTER_VERTICAL)
+        btn_sz.AddStretchSpacer()
+        self.btn_cancel = wx.Button(self, label="Отменить")
+        self.btn_cancel.Bind(wx.EVT_BUTTON, self.on_cancel)
+        btn_sz.Add(self.btn_cancel, 0, wx.EXPAND)
+        self.btn_apply = wx.Button(self, label="Выбрать")
+        self.btn_apply.Bind(wx.EVT_BUTTON, self.on_apply)
+        self.btn_apply.SetDefault()
+        btn_sz.Add(self.btn_apply, 0, wx.EXPAND)
+        sz.Add(btn_sz, 0, wx.EXPAND | wx.ALL, 10)
+        self.SetSizer(sz)
+        self.Layout()
+        self.task = BackgroundTask(
+            self.load_names, self.on_names_loaded, parent=self
+        ).start()
+
+    def load_names(self, task):
+        # Скомпилированный кэш готовится здесь же, чтобы миниатюры и описания
+        # строк потом не собирали его в потоке интерфейса.
+        self.library.compiled(task.progress)
+        return self.library.names()
+
+    def on_names_loaded(self, names):
+        self.all_names = names
+        self.lower_names = {name: name.lower() for name in names}
+        self.filter_text = ""
+        self.filtered = names
+        self.apply_filter(self.search.GetValue())
+
+    def on_filter(self, event):
+        self.apply_filter(self.search.GetValue())
+
+    def on_clear_filter(self, event):
+        self.search.SetValue("")
+
+    def apply_filter(self, text):
+        text = text.strip().lower()
+        if text.startswith(self.filter_text):
+            names = self.filtered
+        else:
+            names = self.all_names
+        self.filter_text = text
+        if text:
+            self.filtered = [n for n in names if text in self.lower_names[n]]
+        else:
+            self.filtered = self.all_names
+        self.gallery.set_names(self.filtered)
+        if self.filtered:
+            self.gallery.SetSelection(0)
+        self.status.SetLabel(
+            "Найдено: %d из %d" % (len(self.filtered), len(self.all_names))
+        )
+        self.btn_apply.Enable(bool(self.filtered))
+
+    def get_name(self):
+        return self.gallery.get_selected_name()
+
+    def on_apply(self, event):
+        if self.get_name() is None:
+            return
+        self.task.cancel()
+        self.EndModal(wx.ID_OK)
+
+    def on_cancel(self, event):
+        self.task.cancel()
+        self.EndModal(wx.ID_CANCEL)
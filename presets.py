@@ -0,0 +1,322 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+from scheme_model import ColorScheme
+
+# Строки JSON и скобки - всё, что нужно для поиска границ пресетов в файле.
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_COLON = re.compile(rb"\s*:")
+
+
+def scan_presets(buffer, pos=0, depth=0):
+    """Yields (name, offset, length) for every top level object of a preset array.
+
+    Only strings and brackets are tokenized, numbers are skipped by the regex
+    engine, so the scan does not build any Python objects for the points.
+    Scanning can be resumed after any yielded object by passing its end as pos
+    with depth=1.
+    """
+    start = None
+    name = None
+    expect_name = False
+    for m in _TOKEN.finditer(buffer, pos):
+        c = buffer[m.start()]
+        if c == ord("{") or c == ord("["):
+            depth += 1
+            if depth == 2 and c == ord("{"):
+                start, name, expect_name = m.start(), None, False
+        elif c == ord("}") or c == ord("]"):
+            if depth == 2 and c == ord("}") and start is not None:
+                if name is not None:
+                    yield name, start, m.end() - start
+                start = None
+            depth -= 1
+        elif depth == 2:
+            if expect_name:
+                name = json.loads(m.group())
+                expect_name = False
+            elif m.group() == b'"Name"' and _COLON.match(buffer, m.end()):
+                expect_name = True
+
+
+def default_cache_dir():
+    base = (
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_CACHE_HOME")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(base, "sigma-properties-panel")
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class CompiledPresets:
+    """Binary cache of every preset of a library, compiled to stop arrays.
+
+    File layout, little endian: a header with the source mtime and size, the
+    preset names and color spaces as a JSON list of [name, color_space]
+    pairs, int64 stop offsets per preset, then all
+    positions as float64 and all colors as uint8 RGB. Sections are 8 byte
+    aligned so the arrays are used directly from the memory-mapped file.
+    """
+
+    MAGIC = b"SGPC"
+    VERSION = 2
+    HEADER = struct.Struct("<4sIqqII")
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.mtime_ns, self.size, count, names_size = (
+                self.HEADER.unpack_from(self._mmap)
+            )
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError("Not a compiled preset cache: %s" % path)
+            pos = self.HEADER.size
+            entries = json.loads(bytes(self._mmap[pos : pos + names_size]))
+            pos = _align(pos + names_size)
+            self.offsets = np.frombuffer(self._mmap, np.int64, count + 1, pos)
+            total = int(self.offsets[-1])
+            pos += self.offsets.nbytes
+            self.positions = np.frombuffer(self._mmap, np.float64, total, pos)
+            pos += self.positions.nbytes
+            self.colors = np.frombuffer(self._mmap, np.uint8, total * 3, pos)
+            self.colors = self.colors.reshape(-1, 3)
+        except Exception:
+            self.close()
+            raise
+        self._names = {name: i for i, (name, _) in enumerate(entries)}
+        self._color_spaces = [color_space for _, color_space in entries]
+
+    @classmethod
+    def write(cls, path, stat, schemes):
+        """Writes {name: ColorScheme} compiled for a source with the given stat."""
+        entries = [[name, o.color_space] for name, o in schemes.items()]
+        names = json.dumps(entries).encode()
+        counts = [len(o) for o in schemes.values()]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        header = cls.HEADER.pack(
+            cls.MAGIC, cls.VERSION, stat[0], stat[1], len(counts), len(names)
+        )
+        padding = b"\0" * (_align(len(header) + len(names)) - len(header) - len(names))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(header + names + padding)
+            f.write(offsets.tobytes())
+            for o in schemes.values():
+                f.write(o.positions.astype("<f8").tobytes())
+            for o in schemes.values():
+                f.write(o.colors.tobytes())
+        os.replace(tmp_path, path)
+
+    def matches(self, stat):
+        return (self.mtime_ns, self.size) == tuple(stat)
+
+    def names(self):
+        return list(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def scheme(self, name) -> ColorScheme:
+        i = self._names[name]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return ColorScheme(
+            positions=self.positions[start:end].copy(),
+            colors=self.colors[start:end].copy(),
+            color_space=self._color_spaces[i],
+        )
+
+    def info(self, name):
+        """Returns (stop count, color space, min, max) without copying the stops."""
+        i = self._names[name]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        if start == end:
+            return 0, self._color_spaces[i], float("nan"), float("nan")
+        return (
+            int(end - start),
+            self._color_spaces[i],
+            float(self.positions[start]),
+            float(self.positions[end - 1]),
+        )
+
+    def close(self):
+        self.offsets = self.positions = self.colors = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+class PresetLibrary:
+    """ParaView preset file (ColorsParaView.json) indexed by preset name.
+
+    The file is read front to back at most once. Looking up a preset scans
+    only as far as needed to find it, and only the requested presets are
+    parsed. Safe to use from a background thread.
+
+    With a cache_dir, schemes come from a CompiledPresets file instead. It is
+    rebuilt from the JSON when the source file's mtime or size changes.
+    """
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._compiled = None
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, stat):
+        self._stat = stat
+        self._index = {}
+        self._scanned_to = 0
+        self._complete = False
+
+    def _scan(self, until=None, progress=None):
+        """Continues the scan until the preset named until is found or the file ends.
+
+        progress(done, total) is called with the number of bytes scanned.
+        """
+        stat = os.stat(self.path)
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if self._stat != stat:
+            self._reset(stat)
+        if self._complete or until in self._index:
+            return
+        with open(self.path, "rb") as f:
+            if stat[1] == 0:
+                self._complete = True
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                pos, depth = self._scanned_to, 1 if self._scanned_to else 0
+                for name, offset, length in scan_presets(buffer, pos, depth):
+                    self._index[name] = (offset, length)
+                    self._scanned_to = offset + length
+                    if progress is not None:
+                        progress(self._scanned_to, stat[1])
+                    if name == until:
+                        return
+        self._complete = True
+
+    def index(self, progress=None):
+        """Returns {name: (offset, length)} for every preset in the file."""
+        with self._lock:
+            self._scan(progress=progress)
+            return dict(self._index)
+
+    def names(self):
+        return list(self.index())
+
+    def __contains__(self, name):
+        with self._lock:
+            self._scan(until=name)
+            return name in self._index
+
+    def __len__(self):
+        return len(self.index())
+
+    def get(self, name, progress=None) -> dict:
+        """Returns the raw preset dictionary."""
+        with self._lock:
+            self._scan(until=name, progress=progress)
+            offset, length = self._index[name]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def cache_path(self):
+        key = hashlib.sha1(os.path.abspath(self.path).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "presets-%s.bin" % key)
+
+    def compiled(self, progress=None):
+        """Returns the compiled presets, rebuilding the cache file if it is stale.
+
+        Returns None if the cache file can not be written. progress(done, total)
+        is called for every preset parsed while rebuilding. A rebuild closes the
+        previously returned object, other threads may only use it while holding
+        the library lock, as scheme() and info() do.
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if self._compiled is not None and self._compiled.matches(stat):
+                return self._compiled
+            if self._compiled is not None:
+                self._compiled.close()
+                self._compiled = None
+            path = self.cache_path()
+            try:
+                compiled = CompiledPresets(path)
+                if not compiled.matches(stat):
+                    compiled.close()
+                    compiled = None
+            except (OSError, ValueError, struct.error):
+                compiled = None
+            if compiled is None:
+                try:
+                    CompiledPresets.write(path, stat, self._compile_all(progress))
+                    compiled = CompiledPresets(path)
+                except OSError:
+                    # Кэш недоступен для записи - дальше читаем пресеты из JSON.
+                    self.cache_dir = None
+                    return None
+            self._compiled = compiled
+            return compiled
+
+    def _compile_all(self, progress=None):
+        schemes = {}
+        names = self.names()
+        for i, name in enumerate(names):
+            if progress is not None:
+                progress(i, len(names))
+            preset = self.get(name)
+            if "RGBPoints" in preset:
+                schemes[name] = self._from_preset(preset)
+        return schemes
+
+    @staticmethod
+    def _from_preset(preset):
+        return ColorScheme.from_paraview(
+            preset["RGBPoints"], preset.get("ColorSpace", "RGB")
+        )
+
+    def info(self, name):
+        """Returns (stop count, color space, min, max) of a preset."""
+        if self.cache_dir is not None:
+            with self._lock:
+                compiled = self.compiled()
+                if compiled is not None and name in compiled:
+                    return compiled.info(name)
+        scheme = self._from_preset(self.get(name))
+        return len(scheme), scheme.color_space, scheme.min_value(), scheme.max_value()
+
+    def scheme(self, name, tolerance=None, progress=None) -> ColorScheme:
+        """Returns the preset as a scheme, simplified to tolerance (delta E) if given.
+
+        progress is passed on to compiled() or to the scan of the JSON file.
+        """
+        scheme = None
+        if self.cache_dir is not None:
+            # Точки копируются под блокировкой: другой поток может пересобрать
+            # кэш и закрыть этот файл сразу после выхода из compiled().
+            with self._lock:
+                compiled = self.compiled(progress)
+                if compiled is not None and name in compiled:
+                    scheme = compiled.scheme(name)
+        if scheme is None:
+            scheme = self._from_preset(self.get(name, progress))
+        if tolerance is not None:
+            scheme.simplify(tolerance)
+        return scheme
@@ -1,65 +1,135 @@
+import dataclasses
+
 import wx
 import wx.propgrid
-import json
 
-from color_scheme import ColorSchemeProperty, ColorScheme, GradientEditor
+from color_scheme import (
+    GRADIENT_EDITOR,
+    ColorSchemeProperty,
+    ColorScheme,
+    GradientEditor,
+    intern_scheme,
+)
+from presets import PresetLibrary, default_cache_dir
 from scale import ScaleProperty, ScaleEditor, Scale
+from tasks import BackgroundTask
+
+
+@dataclasses.dataclass
+class SchemeField:
+    """Description of one color scheme row for PropertiesPanel.add_scheme_fields."""
+
+    name: str
+    label: str
+    value: ColorScheme = None
+    # Пресет, который загружается в фоне и заменяет начальное значение.
+    preset: str = None
+    category: str = "Цветовая схема"
 
 
 class PropertiesPanel(wx.Panel):
     def __init__(self, parent):
         super().__init__(parent)
+        self.presets = PresetLibrary("ColorsParaView.json", default_cache_dir())
+        self.preset_tasks = []
         sz = wx.BoxSizer(wx.VERTICAL)
         self.pg = wx.propgrid.PropertyGrid(
             self, style=wx.propgrid.PG_SPLITTER_AUTO_CENTER
         )
-        self.pg.RegisterEditor(GradientEditor(), "gradient_editor")
+        self.pg.RegisterEditor(GradientEditor(), GRADIENT_EDITOR)
         self.pg.RegisterEditor(ScaleEditor, "scale_editor")
         p = self.pg.Append(wx.propgrid.StringProperty("Имя объекта", "name"))
         p = self.pg.Append(ScaleProperty("Масштаб", "scale"))
         p.SetValue(Scale(100, 200, 150))
         p.SetEditor("scale_editor")
-        c = self.pg.Append(wx.propgrid.PropertyCategory("Цветовая схема"))
-        p = self.pg.AppendIn(c,
-            ColorSchemeProperty(
-                "Мин. напряжения",
-                "color_scheme_min",
-                ColorScheme.basic(
-                    wx.Colour(0, 0, 0), -100, wx.Colour(255, 255, 255), 500
-                ),
-            )
-        )
-        self.pg.SetPropertyEditor(p, "gradient_editor")
-        p = self.pg.AppendIn(c,
-            ColorSchemeProperty(
-                "Сред. напряжения",
-                "color_scheme_mid",
-                ColorScheme.basic(
-                    wx.Colour(0, 0, 0), -100, wx.Colour(255, 255, 255), 500
-                ),
-            )
+        self.add_scheme_fields(
+            [
+                SchemeField("color_scheme_min", "Мин. напряжения", preset="Smin_Val"),
+                SchemeField("color_scheme_mid", "Сред. напряжения", preset="Smid_Val"),
+                SchemeField("color_scheme_max", "Макс. напряжения", preset="Smax_Val"),
+            ]
         )
-        self.pg.SetPropertyEditor(p, "gradient_editor")
-        p = self.pg.AppendIn(c, 
-            ColorSchemeProperty( 
-                "Макс. напряжения",
-                "color_scheme_max",
-                ColorScheme.basic(
-                    wx.Colour(0, 0, 0), -100, wx.Colour(255, 255, 255), 500
-                ),
-            )
-        )
-        self.pg.SetPropertyEditor(p, "gradient_editor")
-        self.pg.Update()
         sz.Add(self.pg, 1, wx.EXPAND)
         self.SetSizer(sz)
         self.Layout()
 
-        with open("ColorsParaView.json", "r") as f:
-            data = json.load(f)
-            color_schema = {}
-            for o in data:
-                color_schema[o["Name"]] = o["RGBPoints"]
-            self.pg.SetPropertyValue("color_scheme_min", ColorScheme.from_paraview(color_schema["Smin_Val"]))
-            self.pg.SetPropertyValue("color_scheme_mid", ColorScheme.from_paraview(color_schema["Smid_Val"]))
-            self.pg.SetPropertyValue("color_scheme_max", ColorScheme.from_paraview(color_schema["Smax_Val"]))
+    @staticmethod
+    def default_scheme():
+        return intern_scheme(
+            ColorScheme.basic(wx.Colour(0, 0, 0), -100, wx.Colour(255, 255, 255), 500)
+        )
+
+    def add_scheme_fields(self, fields, collapsed=False):
+        """Appends a ColorSchemeProperty per field.
+
+        fields is a list of SchemeField or a {name: label} dict. All rows are
+        added inside one Freeze/Thaw, so the grid is laid out and repainted
+        once. Gradients are drawn only for visible rows and the editor
+        control only for the selected one; with collapsed=True the new
+        categories start collapsed. Presets named by the fields are imported
+        in the background.
+        """
+        if isinstance(fields, dict):
+            fields = [SchemeField(name, label) for name, label in fields.items()]
+        categories = {}
+        presets = {}
+        default = None
+        self.pg.Freeze()
+        try:
+            for field in fields:
+                category = categories.get(field.category)
+                if category is None:
+                    category = self.pg.GetPropertyByName(field.category)
+                    if category is None:
+                        category = self.pg.Append(
+                            wx.propgrid.PropertyCategory(field.category)
+                        )
+                    categories[field.category] = category
+                value = field.value
+                if value is None:
+                    # Все строки без значения разделяют один снимок схемы.
+                    if default is None:
+                        default = self.default_scheme()
+                    value = default
+                self.pg.AppendIn(
+                    category,
+                    ColorSchemeProperty(field.label, field.name, value, self.presets),
+                )
+                if field.preset is not None:
+                    presets[field.name] = field.preset
+            if collapsed:
+                for category in categories.values():
+                    self.pg.Collapse(category)
+        finally:
+            self.pg.Thaw()
+        if presets:
+            self.preset_tasks = [t for t in self.preset_tasks if t.running]
+            self.preset_tasks.append(
+                BackgroundTask(
+                    lambda task: self.load_presets(task, presets),
+                    self.on_presets_loaded,
+                    parent=self,
+                    title="Импорт пресетов",
+                ).start()
+            )
+
+    def load_presets(self, task, names):
+        """Runs in a worker thread: the first import compiles the whole library."""
+        self.presets.compiled(task.progress)
+        schemes = {}
+        for i, (prop, name) in enumerate(names.items()):
+            task.progress(i, len(names))
+            try:
+                schemes[prop] = intern_scheme(self.presets.scheme(name))
+            except KeyError:
+                # Поле без пресета в библиотеке остаётся со значением по умолчанию.
+                continue
+        return schemes
+
+    def on_presets_loaded(self, schemes):
+        self.pg.Freeze()
+        try:
+            for prop, scheme in schemes.items():
+                self.pg.SetPropertyValue(prop, scheme)
+        finally:
+            self.pg.Thaw()
@@ -16,6 +16,12 @@ class RulerWidget(wx.Panel):
         self.invert = invert
         self.offset = 0.0
         self.cursor = None
+        self.font = wx.Font(
+            8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL
+        )
+        # Отрисованная линейка без курсора и параметры, с которыми она построена.
+        self._bitmap = None
+        self._bitmap_key = None
         self.SetMinSize(
             wx.Size(15, 15) if orientation == wx.HORIZONTAL else wx.Size(15, 15)
         )
@@ -32,32 +38,59 @@ class RulerWidget(wx.Panel):
 
     def on_paint(self, event):
         dc = wx.PaintDC(self)
-        gc = wx.GraphicsContext.Create(dc)
-
         w, h = self.GetSize()
+        self.paint(dc, w, h)
+
+    def paint(self, dc, w, h):
         if w <= 0 or h <= 0:
             return
-        
-        gc.SetFont(
-            wx.Font(
-                8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL
-            ),
-            wx.Colour(0, 0, 0),
+
+        # В обработчике EVT_PAINT контекст обрезан по области обновления, поэтому
+        # при движении курсора копируются только полосы под старым и новым курсором.
+        dc.DrawBitmap(self.render(w, h), 0, 0)
+        if self.cursor is not None:
+            dc.SetPen(wx.BLACK_PEN)
+            if self.orientation == wx.HORIZONTAL:
+                dc.DrawLine(int(self.cursor), 0, int(self.cursor), h)
+            elif self.orientation == wx.VERTICAL:
+                dc.DrawLine(0, int(self.cursor), w, int(self.cursor))
+
+    def render(self, w, h):
+        """Returns the ruler without the cursor, redrawn only when its geometry changes."""
+        scale = self.GetContentScaleFactor()
+        key = (
+            w,
+            h,
+            scale,
+            self.pixels_per_unit,
+            self.offset,
+            self.factor,
+            self.orientation,
+            self.invert,
         )
+        if self._bitmap is not None and self._bitmap_key == key:
+            return self._bitmap
+
+        bitmap = wx.Bitmap()
+        bitmap.CreateScaled(w, h, wx.BITMAP_SCREEN_DEPTH, scale)
+        dc = wx.MemoryDC(bitmap)
+        gc = wx.GraphicsContext.Create(dc)
+        gc.SetFont(self.font, wx.Colour(0, 0, 0))
         if self.orientation == wx.HORIZONTAL:
             if not self.invert:
                 self.paint_horizontal(gc, w, h)
             else:
                 self.paint_horizontal_inverted(gc, w, h)
-            if self.cursor is not None:
-                gc.StrokeLine(self.cursor, 0, self.cursor, h)
         elif self.orientation == wx.VERTICAL:
             if not self.invert:
                 self.paint_vertical(gc, w, h)
             else:
-                 self.paint_vertical_inverted(gc, w, h)
-            if self.cursor is not None:
-                gc.StrokeLine(0, self.cursor, w, self.cursor)
+                self.paint_vertical_inverted(gc, w, h)
+        del gc
+        dc.SelectObject(wx.NullBitmap)
+        self._bitmap = bitmap
+        self._bitmap_key = key
+        return bitmap
 
     def round_to_multiple(self, value, step):
         return round(value / step) * step
@@ -222,10 +255,26 @@ class RulerWidget(wx.Panel):
             self.draw()
 
     def set_cursor(self, axis_value: float | None, draw = True):
-        """Sets the cursor position on the ruler. in pixels."""
+        """Sets the cursor position on the ruler. in pixels.
+
+        Only the strips under the old and the new cursor are repainted, the rest
+        of the ruler stays as it is on screen.
+        """
+        old_cursor = self.cursor
         self.cursor = axis_value
-        if draw:
-            self.draw()
+        if draw and old_cursor != axis_value:
+            self.refresh_cursor_strip(old_cursor)
+            self.refresh_cursor_strip(axis_value)
+
+    def refresh_cursor_strip(self, cursor):
+        if cursor is None:
+            return
+        w, h = self.GetSize()
+        if self.orientation == wx.HORIZONTAL:
+            rect = wx.Rect(int(cursor) - 1, 0, 3, h)
+        else:
+            rect = wx.Rect(0, int(cursor) - 1, w, 3)
+        self.RefreshRect(rect, eraseBackground=False)
 
     def draw(self):
         self.Refresh()
@@ -0,0 +1,616 @@
+"""Color scheme data model: stops, lookup tables and file formats.
+
+Nothing here depends on wx, so schemes can be built, converted and
+rendered into pixel buffers from worker threads and tests.
+"""
+
+import bisect
+import hashlib
+import json
+import mmap
+import struct
+import threading
+import weakref
+
+import numpy as np
+
+from colorspace import RGB, decimate_stops, interpolate_colors, interpolation_space
+
+# Количество элементов в таблице цветов, в которую компилируется схема.
+LUT_SIZE = 1024
+
+
+def compile_lut(positions, colors, size=LUT_SIZE, color_space=RGB):
+    """Builds a (size, 3) uint8 RGB table sampled evenly over the stop range.
+
+    Interpolation in Lab or Msh is baked into the table, looking colors up
+    costs the same whatever the color space is.
+    """
+    samples = np.linspace(positions[0], positions[-1], size)
+    return interpolate_colors(positions, colors, samples, color_space)
+
+
+# Заголовок двоичного .colorscheme: сигнатура, версия, длина имени
+# цветового пространства и число точек.
+BINARY_MAGIC = b"SGCS"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sHHI")
+
+
+def _stop_arrays(schema):
+    stops = sorted(schema, key=lambda o: o[3])
+    positions = np.array([o[3] for o in stops], dtype=np.float64)
+    colors = np.array([o[:3] for o in stops], dtype=np.float64).reshape(-1, 3)
+    return positions, np.clip(colors, 0, 255).astype(np.uint8)
+
+
+class BaseColorScheme:
+    """Read-only part of a color scheme.
+
+    Stops are kept sorted by position in a float64 positions array and a
+    (n, 3) uint8 colors array. color_space is the ParaView ColorSpace the
+    colors are interpolated in ("RGB", "Lab" or "Diverging"). Derived data
+    (lookup table, hash, JSON text) is cached until the stops change.
+    """
+
+    __slots__ = (
+        "_positions",
+        "_colors",
+        "_color_space",
+        "_version",
+        "_cache",
+        "__weakref__",
+    )
+
+    def __init__(self, schema=None, positions=None, colors=None, color_space=RGB):
+        if schema is not None:
+            positions, colors = _stop_arrays(schema)
+        self._positions = np.asarray(positions, dtype=np.float64)
+        self._colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        self._color_space = color_space
+        self._version = 0
+        self._cache = {}
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def positions(self):
+        return self._positions
+
+    @property
+    def colors(self):
+        return self._colors
+
+    @property
+    def color_space(self):
+        return self._color_space
+
+    @property
+    def schema(self):
+        """Stops as a tuple of (r, g, b, position) tuples."""
+        return tuple(self._stop_list())
+
+    def _stop_list(self):
+        return [
+            (r, g, b, p)
+            for (r, g, b), p in zip(self._colors.tolist(), self._positions.tolist())
+        ]
+
+    def stop(self, index):
+        r, g, b = self._colors[index].tolist()
+        return (r, g, b, float(self._positions[index]))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __eq__(self, other):
+        if not isinstance(other, BaseColorScheme):
+            return NotImplemented
+        return (
+            self._color_space == other._color_space
+            and np.array_equal(self._positions, other._positions)
+            and np.array_equal(self._colors, other._colors)
+        )
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self._color_space == RGB:
+            return "%s(schema=%r)" % (type(self).__name__, self._stop_list())
+        return "%s(schema=%r, color_space=%r)" % (
+            type(self).__name__,
+            self._stop_list(),
+            self._color_space,
+        )
+
+    def min_value(self):
+        return float(self._positions[0])
+
+    def max_value(self):
+        return float(self._positions[-1])
+
+    @classmethod
+    def basic(cls, c0: "wx.Colour", p0: float, c1: "wx.Colour", p1: float):
+        return cls(
+            schema=[
+                (c0.GetRed(), c0.GetGreen(), c0.GetBlue(), p0),
+                (c1.GetRed(), c1.GetGreen(), c1.GetBlue(), p1),
+            ]
+        )
+
+    def range(self):
+        return abs(self.min_value() - self.max_value())
+
+    def _position_list(self):
+        positions = self._cache.get("positions")
+        if positions is None:
+            positions = self._cache["positions"] = self._positions.tolist()
+        return positions
+
+    def lut(self):
+        """Returns the scheme compiled to an RGB lookup table.
+
+        The table is rebuilt only when the stops have changed since the last call.
+        """
+        lut = self._cache.get("lut")
+        if lut is None:
+            lut = self._cache["lut"] = compile_lut(
+                self._positions, self._colors, color_space=self._color_space
+            )
+        return lut
+
+    def color_at(self, pos: float):
+        """Returns the (r, g, b) color at the given position.
+
+        Black outside of the scheme range, white if the scheme is degenerate.
+        """
+        if len(self) < 2:
+            return (255, 255, 255)
+        v_min, v_max = self.min_value(), self.max_value()
+        if not v_min <= pos <= v_max:
+            return (0, 0, 0) if pos == pos else (255, 255, 255)
+        if v_max == v_min:
+            return (255, 255, 255)
+        lut = self.lut()
+        index = int((pos - v_min) * (len(lut) - 1) / (v_max - v_min) + 0.5)
+        r, g, b = lut[index].tolist()
+        return (r, g, b)
+
+    def interpolate(self, pos: float):
+        """Returns the exact (r, g, b) color at pos, bypassing the lookup table.
+
+        The segment is found by binary search over the sorted stop positions.
+        """
+        positions = self._position_list()
+        if len(positions) < 2 or pos != pos:
+            return (255, 255, 255)
+        if pos < positions[0] or pos > positions[-1]:
+            return (0, 0, 0)
+        if interpolation_space(self._color_space) != RGB:
+            r, g, b = self._interpolate_array(np.array([pos]))[0].tolist()
+            return (r, g, b)
+        i = min(bisect.bisect_right(positions, pos) - 1, len(positions) - 2)
+        c0, c1 = self.stop(i), self.stop(i + 1)
+        if c1[3] == c0[3]:
+            return tuple(c1[:3])
+        ratio = (pos - c0[3]) / (c1[3] - c0[3])
+        r = int(c0[0] + ratio * (c1[0] - c0[0]))
+        g = int(c0[1] + ratio * (c1[1] - c0[1]))
+        b = int(c0[2] + ratio * (c1[2] - c0[2]))
+        return (r, g, b)
+
+    def map_values(
+        self,
+        values,
+        below=(0, 0, 0),
+        above=(0, 0, 0),
+        invalid=(255, 255, 255),
+        exact=False,
+    ):
+        """Maps an array of values (or a single value) to colors in one pass.
+
+        Returns a uint8 array of shape values.shape + (3,). Values under or over
+        the scheme range get the below/above colors, NaN values and degenerate
+        schemes get the invalid color, the same as color_at does. With exact=True
+        every value is interpolated between its two stops instead of being
+        rounded to the nearest lookup table entry.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        shape = values.shape + (3,)
+        if len(self) < 2 or self.min_value() == self.max_value():
+            out = np.empty(shape, dtype=np.uint8)
+            out[...] = invalid
+            return out
+        # Скаляры и 0-d массивы считаются как массив из одного значения.
+        values = values.reshape(-1)
+        v_min, v_max = self.min_value(), self.max_value()
+        nan = np.isnan(values)
+        if exact:
+            out = self._interpolate_array(np.where(nan, v_min, values))
+        else:
+            lut = self.lut()
+            scaled = (values - v_min) * ((len(lut) - 1) / (v_max - v_min)) + 0.5
+            np.clip(scaled, 0, len(lut) - 1, out=scaled)
+            scaled[nan] = 0
+            out = lut[scaled.astype(np.intp)]
+        out[values < v_min] = below
+        out[values > v_max] = above
+        out[nan] = invalid
+        return out.reshape(shape)
+
+    def _interpolate_array(self, values):
+        return interpolate_colors(
+            self._positions, self._colors, values, self._color_space
+        )
+
+    def gradient_row(self, width: int):
+        """Returns a (width, 3) uint8 array with the color of every pixel column."""
+        lut = self.lut()
+        indices = np.rint(np.arange(width) * ((len(lut) - 1) / width)).astype(np.intp)
+        return lut[indices]
+
+    def content_hash(self):
+        """Returns a digest of the stops, equal for schemes with the same content."""
+        digest = self._cache.get("hash")
+        if digest is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self._color_space.encode())
+            digest.update(self._positions.tobytes())
+            digest.update(self._colors.tobytes())
+            digest = self._cache["hash"] = digest.hexdigest()
+        return digest
+
+    def simplified(self, tolerance=1.0):
+        """Returns a copy without the stops that can be dropped within tolerance.
+
+        tolerance is the largest allowed color change, as CIE76 delta E.
+        """
+        keep = decimate_stops(
+            self._positions, self._colors, self._color_space, tolerance
+        )
+        return type(self)(
+            positions=self._positions[keep],
+            colors=self._colors[keep],
+            color_space=self._color_space,
+        )
+
+    def freeze(self) -> "FrozenColorScheme":
+        return FrozenColorScheme(
+            positions=self._positions,
+            colors=self._colors,
+            color_space=self._color_space,
+        )
+
+    def state(self):
+        """Returns (positions, colors, color_space) without copying the arrays.
+
+        Meant for ColorScheme.restore() and the undo history: edits that
+        replace all stops assign new arrays, so a state taken before such an
+        edit stays valid.
+        """
+        return self._positions, self._colors, self._color_space
+
+    def thaw(self) -> "ColorScheme":
+        """Returns a mutable copy of the scheme."""
+        return ColorScheme(
+            positions=self._positions.copy(),
+            colors=self._colors.copy(),
+            color_space=self._color_space,
+        )
+
+    def save(self, f, binary=False):
+        """Writes the scheme as JSON text, or in the binary format to a binary file."""
+        f.write(self.to_bytes() if binary else self.to_string())
+
+    @classmethod
+    def load(cls, f):
+        """Reads a scheme saved in either format, from a text or a binary file."""
+        s = f.read()
+        if isinstance(s, bytes):
+            if s.startswith(BINARY_MAGIC):
+                return cls.from_bytes(s)
+            s = s.decode("utf-8")
+        return cls.from_string(s)
+
+    @classmethod
+    def load_file(cls, path):
+        """Reads a scheme file, binary files are memory-mapped instead of read."""
+        with open(path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                f.seek(0)
+                return cls.load(f)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return cls.from_bytes(buffer)
+
+    def to_bytes(self):
+        """Returns the binary form of the scheme.
+
+        A little endian header (magic, version, color space length, stop count)
+        is followed by the color space name, padding to 8 bytes, the float64
+        positions and the uint8 RGB colors. Stops are stored sorted.
+        """
+        color_space = self._color_space.encode("utf-8")
+        header = _BINARY_HEADER.pack(
+            BINARY_MAGIC, BINARY_VERSION, len(color_space), len(self)
+        )
+        head = header + color_space
+        padding = b"\0" * (-len(head) % 8)
+        return b"".join(
+            [
+                head,
+                padding,
+                self._positions.astype("<f8").tobytes(),
+                self._colors.tobytes(),
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """Builds a scheme from to_bytes output without parsing or sorting."""
+        magic, version, cs_size, count = _BINARY_HEADER.unpack_from(buffer)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("Unsupported color scheme format")
+        pos = _BINARY_HEADER.size
+        color_space = bytes(buffer[pos : pos + cs_size]).decode("utf-8")
+        pos += cs_size
+        pos += -pos % 8
+        positions = np.frombuffer(buffer, "<f8", count, pos)
+        colors = np.frombuffer(buffer, np.uint8, count * 3, pos + positions.nbytes)
+        return cls(
+            positions=positions.astype(np.float64),
+            colors=colors.reshape(-1, 3).copy(),
+            color_space=color_space,
+        )
+
+    def to_string(self):
+        """Returns the JSON text of the scheme.
+
+        RGB schemes are a plain list of [r, g, b, position] stops, other color
+        spaces wrap the list as {"ColorSpace": ..., "Points": [...]}.
+        """
+        string = self._cache.get("string")
+        if string is None:
+            schema = list(map(lambda o: list(o), self._stop_list()))
+            if self._color_space != RGB:
+                schema = {"ColorSpace": self._color_space, "Points": schema}
+            string = self._cache["string"] = json.dumps(schema)
+        return string
+
+    @classmethod
+    def from_string(cls, json_str: str):
+        schema = json.loads(json_str)
+        if isinstance(schema, dict):
+            return cls(schema["Points"], color_space=schema.get("ColorSpace", RGB))
+        return cls(schema)
+
+    @classmethod
+    def from_paraview(cls, paraview_rgb_list, color_space=RGB, tolerance=None):
+        """Builds a scheme from ParaView RGBPoints.
+
+        With a tolerance (delta E) the imported stops are simplified.
+        """
+        points = np.asarray(paraview_rgb_list, dtype=np.float64).reshape(-1, 4)
+        order = np.argsort(points[:, 0], kind="stable")
+        points = points[order]
+        colors = np.clip((points[:, 1:] * 255).astype(np.int64), 0, 255)
+        scheme = cls(positions=points[:, 0], colors=colors, color_space=color_space)
+        if tolerance is not None:
+            scheme = scheme.simplified(tolerance)
+        return scheme
+
+    def to_paraview(self):
+        schema = []
+        for o in self._stop_list():
+            schema.append(o[3])
+            schema.append(o[0] / 255)
+            schema.append(o[1] / 255)
+            schema.append(o[2] / 255)
+        return schema
+
+
+class ColorScheme(BaseColorScheme):
+    """Mutable color scheme edited in place by ColorSchemePicker."""
+
+    __slots__ = ()
+
+    @property
+    def schema(self):
+        """Stops as a list of (r, g, b, position) tuples, edits of the list
+        are applied to the scheme."""
+        return SchemaList(self)
+
+    @schema.setter
+    def schema(self, schema):
+        self._positions, self._colors = _stop_arrays(schema)
+        self.touch()
+
+    @BaseColorScheme.color_space.setter
+    def color_space(self, color_space):
+        self._color_space = color_space
+        self.touch()
+
+    def touch(self):
+        """Marks the stops as changed and drops the values cached for them."""
+        self._version += 1
+        self._cache.clear()
+
+    def restore(self, state):
+        """Replaces all stops with a state returned by state()."""
+        positions, colors, self._color_space = state
+        # Массивы замороженной схемы нельзя менять на месте - берём копии.
+        self._positions = positions if positions.flags.writeable else positions.copy()
+        self._colors = colors if colors.flags.writeable else colors.copy()
+        self.touch()
+
+    def add_stop(self, r, g, b, p) -> int:
+        """Inserts a stop keeping the schema sorted, returns its index."""
+        index = bisect.bisect_right(self._position_list(), p)
+        self.insert_stop(index, r, g, b, p)
+        return index
+
+    def insert_stop(self, index, r, g, b, p):
+        """Inserts a stop at exactly index, which must keep the schema sorted.
+
+        Unlike add_stop() this can put the stop before others at the same
+        position, which undo needs to restore hard edges.
+        """
+        color = np.clip((r, g, b), 0, 255)
+        self._positions = np.insert(self._positions, index, p)
+        self._colors = np.insert(self._colors, index, color, axis=0)
+        self.touch()
+
+    def remove_stop(self, index):
+        self._positions = np.delete(self._positions, index)
+        self._colors = np.delete(self._colors, index, axis=0)
+        self.touch()
+
+    def set_stop_color(self, index, r, g, b):
+        self._colors[index] = np.clip((r, g, b), 0, 255)
+        self.touch()
+
+    def move_stop(self, index, p, new_index=None) -> int:
+        """Moves a stop to position p keeping the schema sorted, returns its new index.
+
+        new_index places the stop at exactly that index among stops at the
+        same position, it must keep the schema sorted.
+        """
+        positions, colors = self._positions, self._colors
+        color = colors[index].copy()
+        new = new_index
+        if new is None:
+            if index > 0 and positions[index - 1] > p:
+                new = int(np.searchsorted(positions[:index], p, side="right"))
+            elif index < len(positions) - 1 and positions[index + 1] < p:
+                new = index + int(
+                    np.searchsorted(positions[index + 1 :], p, side="left")
+                )
+            else:
+                new = index
+        if new < index:
+            positions[new + 1 : index + 1] = positions[new:index]
+            colors[new + 1 : index + 1] = colors[new:index]
+        elif new > index:
+            positions[index:new] = positions[index + 1 : new + 1]
+            colors[index:new] = colors[index + 1 : new + 1]
+        positions[new] = p
+        colors[new] = color
+        self.touch()
+        return new
+
+    def simplify(self, tolerance=1.0) -> int:
+        """Drops stops that can be removed within tolerance, returns how many."""
+        simplified = self.simplified(tolerance)
+        removed = len(self) - len(simplified)
+        if removed:
+            self._positions = simplified._positions
+            self._colors = simplified._colors
+            self.touch()
+        return removed
+
+    def sort(self):
+        order = np.argsort(self._positions, kind="stable")
+        self._positions = self._positions[order]
+        self._colors = self._colors[order]
+        self.touch()
+
+    def copy(self) -> "ColorScheme":
+        return self.thaw()
+
+
+class SchemaList(list):
+    """List of the (r, g, b, position) stops of a ColorScheme.
+
+    Every edit of the list is written back to the scheme. The scheme keeps
+    its stops sorted by position, so after an edit the list is re-read from
+    it and may come out in a different order than it was edited in.
+    """
+
+    __slots__ = ("_scheme",)
+
+    def __init__(self, scheme):
+        super().__init__(scheme._stop_list())
+        self._scheme = scheme
+
+    def _sync(self):
+        list.clear(self)
+        list.extend(self, self._scheme._stop_list())
+
+
+def _write_through(name):
+    method = getattr(list, name)
+
+    def edit(self, *args, **kwargs):
+        stops = list(self)
+        result = method(stops, *args, **kwargs)
+        self._scheme.schema = stops
+        self._sync()
+        return self if name.startswith("__i") else result
+
+    edit.__name__ = name
+    edit.__doc__ = method.__doc__
+    return edit
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(SchemaList, _name, _write_through(_name))
+del _name
+
+
+class FrozenColorScheme(BaseColorScheme):
+    """Immutable, hashable color scheme that can be shared between threads."""
+
+    __slots__ = ()
+
+    def __init__(self, schema=None, positions=None, colors=None, color_space=RGB):
+        super().__init__(schema, positions, colors, color_space)
+        self._positions = self._positions.copy()
+        self._colors = self._colors.copy()
+        self._positions.flags.writeable = False
+        self._colors.flags.writeable = False
+
+    def __hash__(self):
+        return hash(self.content_hash())
+
+    def freeze(self):
+        return self
+
+
+_interned = weakref.WeakValueDictionary()
+_interned_lock = threading.Lock()
+
+
+def intern_scheme(color_scheme: BaseColorScheme) -> FrozenColorScheme:
+    """Returns the shared frozen snapshot with the content of color_scheme.
+
+    Equal schemes map to one object, so its lookup table, JSON text and
+    rendered bitmaps are built once. Snapshots no longer referenced anywhere
+    are dropped from the table.
+    """
+    key = color_scheme.content_hash()
+    with _interned_lock:
+        frozen = _interned.get(key)
+        if frozen is None:
+            frozen = color_scheme.freeze()
+            _interned[key] = frozen
+        return frozen
+
+
+def render_gradient(color_scheme: ColorScheme, width: int, height: int):
+    """Renders the gradient into a (height, width, 3) uint8 RGB pixel buffer."""
+    row = color_scheme.gradient_row(width)
+    return np.ascontiguousarray(np.broadcast_to(row, (height, width, 3)))
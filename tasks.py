@@ -0,0 +1,112 @@
+"""Background tasks for file I/O and parsing that must not block the GUI."""
+
+import threading
+
+import wx
+
+# Быстрые задачи завершаются без мелькания окна прогресса.
+PROGRESS_DELAY_MS = 300
+PROGRESS_POLL_MS = 100
+
+
+class Cancelled(Exception):
+    """Raised from BackgroundTask.progress() once the task has been cancelled."""
+
+
+def show_error(error):
+    wx.MessageBox(str(error), "Ошибка", wx.OK | wx.ICON_ERROR)
+
+
+class BackgroundTask:
+    """Runs func(task) in a worker thread and delivers the result with wx.CallAfter.
+
+    on_done(result) or on_error(exception) is called on the GUI thread, neither
+    is called for a cancelled task or when parent has been destroyed. func
+    reports progress with task.progress(done, total), which raises Cancelled
+    after cancel(). With a title, a wx.ProgressDialog with an abort button is
+    shown if the task runs longer than PROGRESS_DELAY_MS.
+    """
+
+    def __init__(self, func, on_done, on_error=show_error, parent=None, title=None):
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.parent = parent
+        self.title = title
+        self._cancel = threading.Event()
+        self._percent = None
+        self._finished = False
+        self._dialog = None
+        self._timer = None
+
+    def start(self):
+        if self.title is not None:
+            self._timer = wx.CallLater(PROGRESS_DELAY_MS, self._poll)
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def running(self):
+        return not self._finished
+
+    def progress(self, done, total):
+        """Called from the worker thread."""
+        if self._cancel.is_set():
+            raise Cancelled()
+        self._percent = done * 100 // total if total else 0
+
+    def _run(self):
+        try:
+            result = self.func(self)
+        except Cancelled:
+            wx.CallAfter(self._finish, None, None)
+        except Exception as e:
+            wx.CallAfter(self._finish, self.on_error, e)
+        else:
+            wx.CallAfter(self._finish, self.on_done, result)
+
+    def _finish(self, callback, value):
+        self._finished = True
+        if self._timer is not None:
+            self._timer.Stop()
+            self._timer = None
+        self._close_dialog()
+        if self.cancelled or callback is None:
+            return
+        if self.parent is not None and not self.parent:
+            return
+        callback(value)
+
+    def _poll(self):
+        if self._finished or self.cancelled:
+            return
+        if self._dialog is None:
+            self._dialog = wx.ProgressDialog(
+                self.title,
+                "Подождите...",
+                maximum=100,
+                parent=self.parent,
+                style=wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME,
+            )
+        percent = self._percent
+        if percent is None:
+            keep_going, _ = self._dialog.Pulse()
+        else:
+            keep_going, _ = self._dialog.Update(min(percent, 99))
+        if not keep_going:
+            self.cancel()
+            self._close_dialog()
+            return
+        self._timer = wx.CallLater(PROGRESS_POLL_MS, self._poll)
+
+    def _close_dialog(self):
+        if self._dialog is not None:
+            self._dialog.Destroy()
+            self._dialog = None
@@ -0,0 +1,70 @@
+import os
+
+from bundle import SchemeBundle
+from scheme_model import ColorScheme
+
+
+def scheme(color):
+    return ColorScheme([(0, 0, 0, 0), color + (1,)])
+
+
+def test_get_after_reopen(tmp_path):
+    path = str(tmp_path / "a.csbundle")
+    with SchemeBundle(path, "a") as bundle:
+        bundle.append("red", scheme((255, 0, 0)))
+        bundle.append("blue", scheme((0, 0, 255)))
+        bundle.append("red", scheme((128, 0, 0)))
+    with SchemeBundle(path) as bundle:
+        assert bundle.names() == ["red", "blue"]
+        assert bundle.get("red") == scheme((128, 0, 0))
+
+
+def test_interrupted_append_keeps_previous_index(tmp_path):
+    path = str(tmp_path / "a.csbundle")
+    with SchemeBundle(path, "a") as bundle:
+        bundle.append("red", scheme((255, 0, 0)))
+    # Начало записи журнала дописано, заголовок не обновлён.
+    record = scheme((0, 0, 255)).to_bytes()
+    with open(path, "ab") as f:
+        f.write(SchemeBundle.ENTRY.pack(4, len(record)) + b"blue" + record[:10])
+    with SchemeBundle(path) as bundle:
+        assert bundle.names() == ["red"]
+        assert bundle.get("red") == scheme((255, 0, 0))
+    with SchemeBundle(path, "a") as bundle:
+        bundle.append("blue", scheme((0, 0, 255)))
+    with SchemeBundle(path) as bundle:
+        assert bundle.get("blue") == scheme((0, 0, 255))
+
+
+def test_compact_drops_replaced_records(tmp_path):
+    path = str(tmp_path / "a.csbundle")
+    with SchemeBundle(path, "a") as bundle:
+        for i in range(5):
+            bundle.append("red", scheme((i, 0, 0)))
+        bundle.compact()
+        assert bundle.get("red") == scheme((4, 0, 0))
+    with SchemeBundle(path) as bundle:
+        assert bundle.names() == ["red"]
+
+
+def test_appends_grow_the_file_linearly(tmp_path):
+    path = str(tmp_path / "a.csbundle")
+    with SchemeBundle(path, "a") as bundle:
+        for i in range(1000):
+            bundle.append("scheme %d" % i, scheme((i % 256, 0, 0)))
+        live = bundle.live_size()
+    assert os.path.getsize(path) < 2 * live
+    with SchemeBundle(path) as bundle:
+        assert len(bundle) == 1000
+        assert bundle.get("scheme 999") == scheme((999 % 256, 0, 0))
+
+
+def test_replacing_compacts_automatically(tmp_path):
+    path = str(tmp_path / "a.csbundle")
+    with SchemeBundle(path, "a") as bundle:
+        for i in range(5000):
+            bundle.append("red", scheme((i % 256, 0, 0)))
+        assert bundle.dead_size() <= SchemeBundle.MIN_COMPACT_SIZE
+    assert os.path.getsize(path) < 2 * SchemeBundle.MIN_COMPACT_SIZE
+    with SchemeBundle(path) as bundle:
+        assert bundle.get("red") == scheme((4999 % 256, 0, 0))
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from colorspace import (
+    DIVERGING,
+    LAB,
+    RGB,
+    _interpolate,
+    decimate_stops,
+    interpolate_colors,
+    lab_to_rgb,
+    rgb_to_lab,
+)
+
+# Концы пресета ParaView "Cool to Warm".
+COOL = (59, 76, 192)
+WARM = (180, 4, 38)
+
+
+def dense_scheme(seed):
+    rng = np.random.default_rng(seed)
+    positions = np.sort(rng.random(200))
+    positions[[0, -1]] = 0, 1
+    t = np.linspace(0, 1, 200)[:, np.newaxis]
+    colors = 128 + 110 * np.sin(t * [3, 5, 7] + rng.random(3) * 6)
+    colors += rng.normal(0, 3, colors.shape)
+    return positions, np.clip(colors, 0, 255).astype(np.uint8)
+
+
+def test_cool_to_warm_midpoint_is_gray():
+    colors = interpolate_colors([0, 1], [COOL, WARM], [0, 0.5, 1], DIVERGING)
+    assert colors.tolist() == [list(COOL), [221, 221, 221], list(WARM)]
+
+
+def test_lab_round_trip():
+    rgb = np.random.default_rng(0).integers(0, 256, (1000, 3))
+    assert np.abs(lab_to_rgb(rgb_to_lab(rgb)) - rgb).max() < 1e-6
+
+
+def test_lab_of_reference_colors():
+    lab = rgb_to_lab([[0, 0, 0], [255, 255, 255], [255, 0, 0]])
+    assert np.allclose(lab, [[0, 0, 0], [100, 0, 0], [53.24, 80.09, 67.20]], atol=0.01)
+
+
+@pytest.mark.parametrize("space", [RGB, LAB, DIVERGING])
+def test_interpolation_keeps_stop_colors(space):
+    positions, colors = dense_scheme(0)
+    assert (interpolate_colors(positions, colors, positions, space) == colors).all()
+
+
+@pytest.mark.parametrize("space", [RGB, LAB, DIVERGING])
+@pytest.mark.parametrize("tolerance", [1.0, 2.0, 5.0])
+def test_decimation_stays_within_tolerance(space, tolerance):
+    positions, colors = dense_scheme(1)
+    keep = decimate_stops(positions, colors, space, tolerance)
+    assert len(keep) < len(positions)
+    values = np.linspace(0, 1, 50001)
+    original = rgb_to_lab(_interpolate(positions, colors, values, space))
+    simplified = rgb_to_lab(_interpolate(positions[keep], colors[keep], values, space))
+    assert np.linalg.norm(original - simplified, axis=-1).max() <= tolerance
@@ -0,0 +1,51 @@
+from scheme_model import ColorScheme
+from history import ADD, COLOR, MOVE, REMOVE, History
+
+
+def hard_edge():
+    return ColorScheme(
+        [(0, 0, 0, 0), (255, 0, 0, 0.5), (0, 0, 255, 0.5), (255, 255, 255, 1)]
+    )
+
+
+def test_undo_move_keeps_hard_edge_order():
+    scheme = hard_edge()
+    history = History(scheme)
+    new = scheme.move_stop(2, 0.3)
+    history.record((MOVE, 2, 0.5, new, 0.3))
+    history.undo()
+    assert scheme == hard_edge()
+    history.redo()
+    assert scheme.stop(new) == (0, 0, 255, 0.3)
+
+
+def test_undo_remove_keeps_hard_edge_order():
+    scheme = hard_edge()
+    history = History(scheme)
+    scheme.remove_stop(1)
+    history.record((REMOVE, 1, (255, 0, 0), 0.5))
+    history.undo()
+    assert scheme == hard_edge()
+
+
+def test_redo_add_inserts_at_recorded_index():
+    scheme = hard_edge()
+    history = History(scheme)
+    scheme.insert_stop(1, 0, 255, 0, 0.5)
+    history.record((ADD, 1, (0, 255, 0), 0.5))
+    edited = scheme.copy()
+    history.undo()
+    assert scheme == hard_edge()
+    history.redo()
+    assert scheme == edited
+
+
+def test_steps_after_hard_edge_undo_address_the_right_stop():
+    scheme = hard_edge()
+    history = History(scheme)
+    history.record((MOVE, 2, 0.5, scheme.move_stop(2, 0.3), 0.3))
+    scheme.set_stop_color(2, 0, 255, 0)
+    history.record((COLOR, 2, (255, 0, 0), (0, 255, 0)))
+    history.undo()
+    history.undo()
+    assert scheme == hard_edge()
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+wx = pytest.importorskip("wx")
+
+import preset_gallery
+from preset_gallery import ThumbnailRenderer
+
+
+class SlowLibrary:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def scheme(self, name):
+        from scheme_model import ColorScheme
+
+        self.release.wait(5)
+        return ColorScheme(positions=[0, 1], colors=[[0, 0, 0], [255, 255, 255]])
+
+
+def test_discard_pending_does_not_deadlock(monkeypatch):
+    ready = []
+    monkeypatch.setattr(preset_gallery.wx, "CallAfter", lambda f, *a: ready.append(a))
+    library = SlowLibrary()
+    renderer = ThumbnailRenderer(library, 8, 2, workers=1)
+    renderer.request("a", None)
+    renderer.request("b", None)
+
+    done = threading.Event()
+
+    def discard():
+        renderer.discard_pending({"a"})
+        done.set()
+
+    threading.Thread(target=discard, daemon=True).start()
+    discarded = done.wait(2)
+    library.release.set()
+    assert discarded, "discard_pending deadlocked"
+    renderer.shutdown(wait=True)
+    assert "b" not in renderer._pending
+    assert renderer.buffers.get("b") is None
+    assert renderer.buffers.get("a") is not None
+
+
+class GatedLibrary:
+    """Each call to scheme() waits for its own gate."""
+
+    def __init__(self):
+        self.gates = [threading.Event(), threading.Event()]
+        self.calls = 0
+
+    def scheme(self, name):
+        from scheme_model import ColorScheme
+
+        gate = self.gates[self.calls]
+        self.calls += 1
+        gate.wait(5)
+        return ColorScheme(positions=[0, 1], colors=[[0, 0, 0], [255, 255, 255]])
+
+
+def test_discarded_running_thumbnail_keeps_new_request(monkeypatch):
+    monkeypatch.setattr(preset_gallery.wx, "CallAfter", lambda f, *a: None)
+    library = GatedLibrary()
+    renderer = ThumbnailRenderer(library, 8, 2, workers=2)
+    renderer.request("a", None)
+    first = renderer._pending["a"]
+    while not first.running():
+        pass
+    renderer.discard_pending(set())
+    renderer.request("a", None)
+    second = renderer._pending["a"]
+    try:
+        library.gates[0].set()
+        first.result(5)
+        # _done первой задачи кладёт буфер в кэш после работы с _pending.
+        while renderer.buffers.get("a") is None:
+            pass
+        assert renderer._pending.get("a") is second
+    finally:
+        library.gates[1].set()
+        renderer.shutdown(wait=True)
@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import threading
+
+from presets import PresetLibrary
+
+
+def write_presets(path, count):
+    presets = [
+        {"Name": "preset %d" % i, "ColorSpace": "Lab", "RGBPoints": [0, 0, 0, 0, 1, 1, 1, 1]}
+        for i in range(count)
+    ]
+    with open(path + ".tmp", "w") as f:
+        json.dump(presets, f)
+    os.replace(path + ".tmp", path)
+
+
+def test_schemes_survive_concurrent_cache_rebuilds(tmp_path):
+    path = str(tmp_path / "presets.json")
+    write_presets(path, 50)
+    library = PresetLibrary(path, cache_dir=str(tmp_path / "cache"))
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                for i in range(50):
+                    library.scheme("preset %d" % i)
+                    library.info("preset %d" % i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    interval = sys.getswitchinterval()
+    # Частое переключение потоков, чтобы чтение попадало между compiled() и пересборкой.
+    sys.setswitchinterval(1e-6)
+    for thread in threads:
+        thread.start()
+    try:
+        for version in range(1, 60):
+            # Другой размер файла делает кэш устаревшим при любой точности mtime.
+            write_presets(path, 50 + version)
+            os.utime(path, ns=(version * 10**9, version * 10**9))
+            library.compiled()
+    finally:
+        stop.set()
+        sys.setswitchinterval(interval)
+        for thread in threads:
+            thread.join()
+    assert not errors
+    assert len(library.compiled().names()) == 109
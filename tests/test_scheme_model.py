@@ -0,0 +1,84 @@
+import json
+
+import numpy as np
+import pytest
+
+from scheme_model import ColorScheme, FrozenColorScheme
+
+
+def two_stops():
+    return ColorScheme([(0, 0, 0, 0.0), (255, 255, 255, 1.0)])
+
+
+def test_schema_append_writes_through():
+    scheme = two_stops()
+    scheme.schema.append((255, 0, 0, 0.5))
+    assert len(scheme) == 3
+    assert scheme.stop(1) == (255, 0, 0, 0.5)
+
+
+def test_schema_item_assignment_and_sort_write_through():
+    scheme = two_stops()
+    schema = scheme.schema
+    schema[0] = (0, 0, 255, 2.0)
+    schema.sort(key=lambda o: o[3])
+    assert scheme.schema == [(255, 255, 255, 1.0), (0, 0, 255, 2.0)]
+    assert schema == scheme.schema
+
+
+def test_schema_delete_writes_through():
+    scheme = two_stops()
+    del scheme.schema[0]
+    assert len(scheme) == 1
+
+
+def test_schema_is_json_serializable():
+    assert json.loads(json.dumps(two_stops().schema)) == [[0, 0, 0, 0.0], [255, 255, 255, 1.0]]
+
+
+def test_frozen_schema_can_not_be_edited():
+    frozen = two_stops().freeze()
+    assert isinstance(frozen, FrozenColorScheme)
+    with pytest.raises(AttributeError):
+        frozen.schema.append((255, 0, 0, 0.5))
+
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_map_values_accepts_scalars(exact):
+    scheme = two_stops()
+    expected = scheme.map_values([0.0, 1.0, 2.0, float("nan")], exact=exact)
+    for value, color in zip((0.0, 1.0, 2.0, float("nan")), expected):
+        out = scheme.map_values(value, exact=exact)
+        assert out.shape == (3,)
+        assert out.tolist() == color.tolist()
+    assert scheme.map_values(np.float64(0.5), exact=exact).shape == (3,)
+    assert scheme.map_values(np.zeros((2, 3)), exact=exact).shape == (2, 3, 3)
+
+
+def test_lut_bakes_in_the_color_space():
+    scheme = ColorScheme([(59, 76, 192, 0.0), (180, 4, 38, 1.0)], color_space="Diverging")
+    assert np.abs(scheme.map_values(0.5).astype(int) - 221).max() <= 1
+    assert scheme.map_values(0.5, exact=True).tolist() == [221, 221, 221]
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_load_file_detects_the_format(tmp_path, binary):
+    scheme = ColorScheme(
+        [(59, 76, 192, -1.0), (221, 221, 221, 0.25), (180, 4, 38, 2.0)],
+        color_space="Lab",
+    )
+    path = tmp_path / "scheme.colorscheme"
+    with open(path, "wb" if binary else "w") as f:
+        scheme.save(f, binary=binary)
+    loaded = ColorScheme.load_file(str(path))
+    assert loaded.schema == scheme.schema
+    assert loaded.color_space == "Lab"
+    with open(path, "rb") as f:
+        assert ColorScheme.load(f).schema == scheme.schema
+
+
+def test_from_bytes_rejects_other_data():
+    data = bytearray(two_stops().to_bytes())
+    data[4] += 1
+    with pytest.raises(ValueError):
+        ColorScheme.from_bytes(bytes(data))